@@ -0,0 +1,59 @@
+"""
+Create an admin account from the command line. /admin/register needs an
+admin token, so this is how the first admin of a new database is made.
+
+    python -m app.create_admin --email admin@school.edu --name "Admin"
+
+The password is asked for twice, or read from the first line of standard
+input with --password-stdin.
+"""
+import argparse
+import getpass
+import sys
+import bcrypt
+from sqlalchemy import select
+from app import models
+from app.config import BCRYPT_ROUNDS
+from app.database import SyncSessionLocal
+
+
+def create_admin(email: str, password: str, name: str) -> int:
+    """Insert the admin and return its id. Raises ValueError if the email is taken."""
+    with SyncSessionLocal() as db:
+        if db.execute(select(models.AdminUser.id).filter(models.AdminUser.email == email)).first():
+            raise ValueError(f"Admin email already registered: {email}")
+        admin = models.AdminUser(
+            email=email,
+            password=bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(BCRYPT_ROUNDS)).decode("utf-8"),
+            name=name,
+        )
+        db.add(admin)
+        db.commit()
+        return admin.id
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create an admin account.")
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--name", default="Admin")
+    parser.add_argument("--password-stdin", action="store_true", help="read the password from standard input")
+    args = parser.parse_args()
+
+    if args.password_stdin:
+        password = sys.stdin.readline().rstrip("\r\n")
+    else:
+        password = getpass.getpass("Password: ")
+        if password != getpass.getpass("Repeat password: "):
+            sys.exit("Passwords don't match")
+    if not password:
+        sys.exit("The password must not be empty")
+
+    try:
+        admin_id = create_admin(args.email, password, args.name)
+    except ValueError as e:
+        sys.exit(str(e))
+    print(f"Created admin {admin_id} ({args.email})")
+
+
+if __name__ == "__main__":
+    main()
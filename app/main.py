@@ -1,11 +1,41 @@
-from fastapi import FastAPI
+import asyncio
+import math
+import asyncpg
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
+from sqlalchemy.exc import DataError, DBAPIError
+from app.config import DB_CREATE_ALL, READINESS_TIMEOUT
 from app.database import Base, engine
-from app.routers import users, admin, teachers, students
+from app.routers import users, admin, teachers, students, events
+from app.utils.auth import PasswordHasherBusy, shutdown_password_hasher
+from app.utils.events import broker
+from app.utils.rate_limit import RateLimited
+from app.utils.metrics import CONTENT_TYPE_LATEST, MetricsMiddleware, render as render_metrics, start_metrics_flusher, stop_metrics_flusher
+from app.utils.request_stats import RequestStatsMiddleware
+from app.utils.tokens import require_admin, require_user, start_revocation_sync, stop_revocation_sync
 
-Base.metadata.create_all(bind=engine)
 
-app = FastAPI(title="Student Management System")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The schema is managed by Alembic; nothing here touches the database
+    # unless DB_CREATE_ALL asks for it, so workers boot without Postgres
+    if DB_CREATE_ALL:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+    start_metrics_flusher()
+    start_revocation_sync()
+    broker.start()
+    yield
+    broker.stop()
+    stop_revocation_sync()
+    stop_metrics_flusher()
+    shutdown_password_hasher()
+    await engine.dispose()
+
+app = FastAPI(title="Student Management System", lifespan=lifespan)
 
 origins = [
     "http://localhost:3000",
@@ -18,12 +48,65 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(RequestStatsMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+@app.exception_handler(PasswordHasherBusy)
+async def password_hasher_busy_handler(request: Request, exc: PasswordHasherBusy):
+    return JSONResponse(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        content={"detail": "Too many authentication requests, please retry"},
+        headers={"Retry-After": "1"},
+    )
+
+@app.exception_handler(RateLimited)
+async def rate_limited_handler(request: Request, exc: RateLimited):
+    return JSONResponse(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        content={"detail": "Too many attempts, please retry later"},
+        headers={"Retry-After": str(math.ceil(exc.retry_after))},
+    )
+
+@app.exception_handler(DBAPIError)
+async def invalid_input_handler(request: Request, exc: DBAPIError):
+    # A value the column can't hold, such as an id beyond int32: asyncpg
+    # refuses to send it, or Postgres rejects it
+    if isinstance(exc, DataError) or isinstance(exc.orig.__cause__, asyncpg.DataError):
+        return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content={"detail": "Invalid value in request"})
+    raise exc
 
 app.include_router(users.router, prefix="/users", tags=["users"])
-app.include_router(admin.router, prefix="/admin", tags=["admin"])
-app.include_router(teachers.router, prefix="/teachers", tags=["teachers"])
-app.include_router(students.router, prefix="/students", tags=["students"])
+app.include_router(admin.public_router, prefix="/admin", tags=["admin"])
+app.include_router(admin.router, prefix="/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+app.include_router(teachers.router, prefix="/teachers", tags=["teachers"], dependencies=[Depends(require_user)])
+app.include_router(students.router, prefix="/students", tags=["students"], dependencies=[Depends(require_user)])
+app.include_router(events.router, prefix="/events", tags=["events"])
 
 @app.get("/")
-def root():
-    return {"message": "Welcome to the Student Management System"}
\ No newline at end of file
+async def root():
+    return {"message": "Welcome to the Student Management System"}
+
+@app.get("/healthz", include_in_schema=False)
+async def healthz():
+    """Liveness: the worker is up and its event loop answers."""
+    return {"status": "ok"}
+
+async def _ping_database():
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+@app.get("/readyz", include_in_schema=False)
+async def readyz():
+    """Readiness: the worker can reach the database."""
+    try:
+        await asyncio.wait_for(_ping_database(), READINESS_TIMEOUT)
+    except Exception:
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"status": "unavailable", "detail": "Database unreachable"},
+        )
+    return {"status": "ok"}
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE_LATEST)
@@ -1,9 +1,11 @@
-from sqlalchemy import Column, Integer, String, ForeignKey
+from sqlalchemy import Column, Integer, String, Numeric, ForeignKey, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from app.database import Base
 
 class User(Base):
     __tablename__ = "users"
+    # The lower(name)/lower(email) search indexes are Postgres-only and
+    # partly need pg_trgm, so they live in migration b5d2e8f41c07 only
     id = Column(Integer, primary_key=True, index=True)
     email = Column(String, unique=True, index=True)
     password = Column(String)
@@ -26,8 +28,8 @@ class Subject(Base):
 class Teacher(Base):
     __tablename__ = "teachers"
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
-    subject_id = Column(Integer, ForeignKey("subjects.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    subject_id = Column(Integer, ForeignKey("subjects.id"), index=True)
 
 class Class(Base):
     __tablename__ = "classes"
@@ -37,26 +39,44 @@ class Class(Base):
 class Student(Base):
     __tablename__ = "students"
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
-    class_id = Column(Integer, ForeignKey("classes.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    class_id = Column(Integer, ForeignKey("classes.id"), index=True)
 
 class TeacherClass(Base):
     __tablename__ = "teacher_class"
+    __table_args__ = (
+        Index("ix_teacher_class_teacher_id_class_id", "teacher_id", "class_id"),
+        Index("ix_teacher_class_class_id_teacher_id", "class_id", "teacher_id"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     class_id = Column(Integer, ForeignKey("classes.id"))
     teacher_id = Column(Integer, ForeignKey("teachers.id"))
 
 class Score(Base):
     __tablename__ = "scores"
+    __table_args__ = (
+        UniqueConstraint("student_id", "subject_id", name="uq_scores_student_subject"),
+        Index("ix_scores_subject_id_student_id", "subject_id", "student_id"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     student_id = Column(Integer, ForeignKey("students.id"))
     subject_id = Column(Integer, ForeignKey("subjects.id"))
-    scores = Column(String)
+    scores = Column(Numeric(5, 2))
 
 class Schedule(Base):
     __tablename__ = "schedules"
+    __table_args__ = (
+        # One lesson per class and slot; create-schedule relies on it against races
+        Index("uq_schedules_class_id_date_time_slot", "class_id", "date", "time_slot", unique=True),
+    )
     id = Column(Integer, primary_key=True, index=True)
     date = Column(String)
     class_id = Column(Integer, ForeignKey("classes.id"))
     time_slot = Column(Integer)
-    subject = Column(String)
\ No newline at end of file
+    subject = Column(String)
+
+class RevokedToken(Base):
+    __tablename__ = "revoked_tokens"
+    jti = Column(String, primary_key=True)
+    # exp claim of the token (Unix time); the row is useless after it
+    expires_at = Column(Integer, index=True)
@@ -1,57 +1,88 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from ..database import SessionLocal
+import asyncpg
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, insert, delete, bindparam, exists, func, and_, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..config import SCHOOL_DAYS, SLOTS_PER_DAY
+from ..database import get_db, pool_stats
 from .. import models, schemas
-from ..utils.auth import hash_password, verify_password, create_access_token
+from ..utils.analytics import grade_stats
+from ..utils.rankings import rankings, describe
+from ..utils.cache import response_cache
+from ..utils.events import broker, SCHOOL
+from ..utils.enrollment import parse_items, enroll
+from ..utils.gradebook import FIXED_COLUMNS, load_subjects, gradebook_rows, stream_csv, stream_xlsx
+from ..utils.timetable import generate_timetable, TimetableError
+from ..utils.rate_limit import auth_limiter
+from ..utils.tokens import authenticate, revoke_token
+from ..utils.auth import hash_password, verify_password, password_needs_rehash, create_access_token, PasswordHasherBusy
 
+# Login needs no token; every other admin route requires an admin token
+# (see app/main.py). The first admin is created with `python -m app.create_admin`.
+public_router = APIRouter()
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @router.post("/register", response_model=schemas.UserOut)
-def register_admin(admin_data: schemas.AdminCreate, db: Session = Depends(get_db)):
-    existing_admin = db.query(models.AdminUser).filter(models.AdminUser.email == admin_data.email).first()
+async def register_admin(admin_data: schemas.AdminCreate, request: Request, db: AsyncSession = Depends(get_db)):
+    """
+    Create another admin account. Only admins may do this.
+    """
+    await auth_limiter.check(request, admin_data.email)
+    existing_admin = (await db.execute(select(models.AdminUser).filter(models.AdminUser.email == admin_data.email))).scalars().first()
     if existing_admin:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Admin email already registered"
         )
-    hashed_pass = hash_password(admin_data.password)
+    hashed_pass = await hash_password(admin_data.password)
     new_admin = models.AdminUser(
         email=admin_data.email,
         password=hashed_pass,
         name=admin_data.name
     )
     db.add(new_admin)
-    db.commit()
-    db.refresh(new_admin)
+    await db.commit()
     return schemas.UserOut(id=new_admin.id, email=new_admin.email, name=new_admin.name)
 
-@router.post("/login", response_model=schemas.Token)
-def login_admin(credentials: schemas.UserLogin, db: Session = Depends(get_db)):
-    admin_user = db.query(models.AdminUser).filter(models.AdminUser.email == credentials.email).first()
-    if not admin_user or not verify_password(credentials.password, admin_user.password):
+@public_router.post("/login", response_model=schemas.Token)
+async def login_admin(credentials: schemas.UserLogin, request: Request, db: AsyncSession = Depends(get_db)):
+    await auth_limiter.check(request, credentials.email)
+    admin_user = (await db.execute(select(models.AdminUser).filter(models.AdminUser.email == credentials.email))).scalars().first()
+    if not admin_user or not await verify_password(credentials.password, admin_user.password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid admin credentials"
         )
+    if password_needs_rehash(admin_user.password):
+        try:
+            admin_user.password = await hash_password(credentials.password)
+            await db.commit()
+        except PasswordHasherBusy:
+            pass  # Keep the old hash, try again on the next login
     access_token = create_access_token({"admin_id": admin_user.id, "role": "admin"}, 60)
     return {"access_token": access_token, "token_type": "bearer"}
 
+@public_router.post("/logout")
+async def logout_admin(claims: dict = Depends(authenticate), db: AsyncSession = Depends(get_db)):
+    """
+    Revoke the token the request was made with.
+    """
+    await revoke_token(db, claims)
+    return {"message": "Logged out"}
+
 @router.post("/create-class")
-def create_class(name: str, db: Session = Depends(get_db)):
+async def create_class(name: str, db: AsyncSession = Depends(get_db)):
     new_class = models.Class(name=name)
     db.add(new_class)
-    db.commit()
+    await db.commit()
+    response_cache.invalidate("classes")
     return {"id": new_class.id, "name": new_class.name}
 
 @router.post("/assign-teacher-to-class")
-def assign_teacher(payload: dict, db: Session = Depends(get_db)):
+async def assign_teacher(payload: dict, db: AsyncSession = Depends(get_db)):
     """
     Assign a teacher to a class.
     """
@@ -59,54 +90,355 @@ def assign_teacher(payload: dict, db: Session = Depends(get_db)):
     class_id = payload.get("class_id")
     if not teacher_id or not class_id:
         raise HTTPException(status_code=400, detail="Teacher ID and Class ID are required")
+    try:
+        teacher_id, class_id = int(teacher_id), int(class_id)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="teacher_id and class_id must be integers")
     # Check if the teacher and class exist
-
-    teacher = db.query(models.Teacher).filter(models.Teacher.id == teacher_id).first()
-    class_obj = db.query(models.Class).filter(models.Class.id == class_id).first()
+    teacher = await db.get(models.Teacher, teacher_id)
+    class_obj = await db.get(models.Class, class_id)
     if not teacher or not class_obj:
         raise HTTPException(status_code=404, detail="Teacher or Class not found")
     teacher_class = models.TeacherClass(teacher_id=teacher_id, class_id=class_id)
     db.add(teacher_class)
-    db.commit()
+    await db.commit()
+    response_cache.invalidate(f"teacher:{teacher_id}")
     return {"message": "Teacher assigned to class successfully"}
 
+async def _enroll(request: Request, db: AsyncSession, role: str) -> dict:
+    content_type = request.headers.get("content-type", "")
+    ndjson = "ndjson" in content_type or "jsonl" in content_type
+    errors = []
+    try:
+        items = await parse_items(request, ndjson, errors)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        result = await enroll(db, role, items, errors)
+    except IntegrityError:
+        raise HTTPException(status_code=409, detail="The batch conflicts with a concurrent change, nothing was enrolled; please retry")
+    if role == "student":
+        for class_id in result["class_ids"]:
+            response_cache.invalidate(f"class:{class_id}")
+    elif result["created"]:
+        response_cache.invalidate("teachers")
+    errors.sort(key=lambda e: e["item"])
+    return {"enrolled": len(result["created"]), "rejected": len(errors), "created": result["created"], "errors": errors}
+
+@router.post("/enroll-students")
+async def enroll_students(request: Request, db: AsyncSession = Depends(get_db)):
+    """
+    Enroll many students at once. The body is a JSON array or, with an
+    NDJSON content type, one object per line. Each item has a class_id and
+    either the user_id of an existing user or the fields of a new user
+    (email, password, name, gender, date_of_birth).
+    Valid items are enrolled in one transaction; the others are reported
+    in `errors` by their position in the batch.
+    """
+    return await _enroll(request, db, "student")
+
+@router.post("/enroll-teachers")
+async def enroll_teachers(request: Request, db: AsyncSession = Depends(get_db)):
+    """
+    Enroll many teachers at once, like /enroll-students. Each item has a
+    subject_id instead of a class_id, plus optional class_ids the teacher
+    is assigned to.
+    """
+    return await _enroll(request, db, "teacher")
+
 @router.post("/create-schedule")
-def create_schedule(payload: dict, db: Session = Depends(get_db)):
+async def create_schedule(payload: dict, db: AsyncSession = Depends(get_db)):
     """
     Create a schedule for a class.
+    Rejects the slot if the class already has a lesson then, or if a teacher
+    of the subject in this class is teaching another class at that time.
     """
     class_id = payload.get("class_id")
+    date = payload.get("date")
     time_slot = payload.get("time_slot")
     subject = payload.get("subject")
-    schedule = models.Schedule(class_id=class_id, time_slot=time_slot, subject=subject)
+    if not class_id or not time_slot or not subject:
+        raise HTTPException(status_code=400, detail="Class ID, time slot and subject are required")
+    try:
+        class_id, time_slot = int(class_id), int(time_slot)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="class_id and time_slot must be integers")
+    if not 1 <= time_slot <= SLOTS_PER_DAY:
+        raise HTTPException(status_code=400, detail=f"time_slot must be between 1 and {SLOTS_PER_DAY}")
+    if not isinstance(subject, str) or (date is not None and not isinstance(date, str)):
+        raise HTTPException(status_code=400, detail="subject and date must be strings")
+
+    # Teachers of this subject assigned to this class, and the classes they teach
+    teacher_ids = (
+        select(models.Teacher.id)
+        .join(models.TeacherClass, models.TeacherClass.teacher_id == models.Teacher.id)
+        .join(models.Subject, models.Subject.id == models.Teacher.subject_id)
+        .filter(models.TeacherClass.class_id == class_id, models.Subject.name == subject)
+    )
+    their_classes = select(models.TeacherClass.class_id).filter(models.TeacherClass.teacher_id.in_(teacher_ids))
+    clash = (await db.execute(
+        select(models.Schedule.class_id, models.Schedule.subject)
+        .filter(models.Schedule.date == date, models.Schedule.time_slot == time_slot)
+        .filter(or_(
+            models.Schedule.class_id == class_id,
+            and_(models.Schedule.subject == subject, models.Schedule.class_id.in_(their_classes)),
+        ))
+        .limit(1)
+    )).first()
+    if clash and clash.class_id == class_id:
+        raise HTTPException(status_code=409, detail=f"Class already has {clash.subject} in this time slot")
+    if clash:
+        raise HTTPException(status_code=409, detail=f"The {subject} teacher already teaches class {clash.class_id} in this time slot")
+
+    schedule = models.Schedule(class_id=class_id, date=date, time_slot=time_slot, subject=subject)
     db.add(schedule)
-    db.commit()
+    try:
+        await db.commit()
+    except IntegrityError as e:
+        # A concurrent request took the slot after the clash check
+        if isinstance(e.orig.__cause__, asyncpg.UniqueViolationError):
+            raise HTTPException(status_code=409, detail="Class already has a lesson in this time slot")
+        raise HTTPException(status_code=404, detail="Class not found")
+    await broker.publish(
+        [f"class:{class_id}"], "schedule",
+        {"class_id": class_id, "date": date, "time_slot": time_slot, "subject": subject},
+    )
     return {"id": schedule.id, "class_id": schedule.class_id, "time_slot": schedule.time_slot, "subject": schedule.subject}
 
-@router.get("/teachers")
-def get_teachers(db: Session = Depends(get_db)):
-    users = db.query(models.User).all()
-    teachers = db.query(models.Teacher).all()
-    subjects = db.query(models.Subject).all()
-    # Join the tables
-    result = []
-    for teacher in teachers:
-        user = db.query(models.User).filter(models.User.id == teacher.user_id).first()
-        subject = db.query(models.Subject).filter(models.Subject.id == teacher.subject_id).first()
-        result.append({
-            "teacher_id": teacher.id,
-            "user_id": user.id if user else None,
-            "name": user.name if user else "Unknown",
-            "subject": subject.name if subject else "Unknown",
-        })
+@router.post("/generate-timetable")
+async def generate_school_timetable(payload: dict, db: AsyncSession = Depends(get_db)):
+    """
+    Replace the schedules of every class with a generated clash-free timetable.
+    payload: weekly_hours ({subject_id: lessons per week}, defaults to the week
+    split evenly between all subjects), days, slots_per_day and dry_run.
+    """
+    try:
+        days = int(payload.get("days", SCHOOL_DAYS))
+        slots_per_day = int(payload.get("slots_per_day", SLOTS_PER_DAY))
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="days and slots_per_day must be integers")
+    # Bounded by the configured week: larger grids cost memory and time in the
+    # generator and would store slots create-schedule rejects
+    if not 1 <= days <= SCHOOL_DAYS or not 1 <= slots_per_day <= SLOTS_PER_DAY:
+        raise HTTPException(
+            status_code=400,
+            detail=f"days must be between 1 and {SCHOOL_DAYS} and slots_per_day between 1 and {SLOTS_PER_DAY}",
+        )
+
+    class_ids = (await db.execute(select(models.Class.id).order_by(models.Class.id))).scalars().all()
+    subjects = dict((await db.execute(select(models.Subject.id, models.Subject.name))).all())
+    teacher_subjects = dict((await db.execute(select(models.Teacher.id, models.Teacher.subject_id))).all())
+    assignments = [tuple(row) for row in await db.execute(select(models.TeacherClass.teacher_id, models.TeacherClass.class_id))]
+
+    weekly_hours = payload.get("weekly_hours")
+    if weekly_hours is None:
+        per_subject = days * slots_per_day // len(subjects) if subjects else 0
+        weekly_hours = {subject_id: per_subject for subject_id in subjects}
+    else:
+        try:
+            weekly_hours = {int(k): int(v) for k, v in weekly_hours.items()}
+        except (AttributeError, TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="weekly_hours must map subject IDs to lesson counts")
+        if any(not 0 <= hours <= days * slots_per_day for hours in weekly_hours.values()):
+            raise HTTPException(status_code=400, detail=f"Lesson counts must be between 0 and {days * slots_per_day}")
+        unknown = set(weekly_hours) - set(subjects)
+        if unknown:
+            raise HTTPException(status_code=404, detail=f"Subjects not found: {sorted(unknown)}")
+
+    try:
+        placements, unplaced, unstaffed = await run_in_threadpool(
+            generate_timetable, class_ids, teacher_subjects, assignments, weekly_hours, days, slots_per_day
+        )
+    except TimetableError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    rows = [
+        {"class_id": p.class_id, "date": str(p.day), "time_slot": p.slot, "subject": subjects[p.subject_id]}
+        for p in placements
+    ]
+    dry_run = bool(payload.get("dry_run"))
+    if not dry_run:
+        await db.execute(delete(models.Schedule))
+        if rows:
+            await db.execute(insert(models.Schedule), rows)
+        await db.commit()
+        # Every class changed: one event on the topic all streams listen to
+        await broker.publish([SCHOOL], "timetable", {"scheduled": len(rows)})
+
+    result = {
+        "scheduled": len(rows),
+        "unplaced": [{"class_id": c, "subject_id": s, "teacher_id": t} for c, s, t in unplaced],
+        "unstaffed": [{"class_id": c, "subject_id": s} for c, s in unstaffed],
+    }
+    if dry_run:
+        result["schedules"] = rows
     return result
 
+@router.get("/teachers")
+async def get_teachers(
+    limit: int = Query(100, ge=1, le=1000),
+    after: Optional[int] = None,
+    subject_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Return a page of teachers ordered by teacher id.
+    Pass the last teacher_id of a page as `after` to get the next one.
+    """
+    query = (
+        select(
+            models.Teacher.id.label("teacher_id"),
+            models.User.id.label("user_id"),
+            models.User.name.label("name"),
+            models.Subject.id.label("found_subject_id"),
+            models.Subject.name.label("subject"),
+        )
+        .outerjoin(models.User, models.User.id == models.Teacher.user_id)
+        .outerjoin(models.Subject, models.Subject.id == models.Teacher.subject_id)
+    )
+    if after is not None:
+        query = query.filter(models.Teacher.id > after)
+    if subject_id is not None:
+        query = query.filter(models.Teacher.subject_id == subject_id)
+    rows = (await db.execute(query.order_by(models.Teacher.id).limit(limit))).all()
+
+    return [
+        {
+            "teacher_id": row.teacher_id,
+            "user_id": row.user_id,
+            "name": row.name if row.user_id is not None else "Unknown",
+            "subject": row.subject if row.found_subject_id is not None else "Unknown",
+        }
+        for row in rows
+    ]
+
+def _like_escape(value: str) -> str:
+    """Escape LIKE wildcards so the search term matches literally."""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+@router.get("/users")
+async def search_users(
+    q: str = Query(..., max_length=100),
+    match: str = Query("substring", regex="^(prefix|substring)$"),
+    role: Optional[str] = Query(None, regex="^(teacher|student)$"),
+    limit: int = Query(50, ge=1, le=500),
+    after: Optional[int] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Search users by name or email, ignoring case, ordered by user id.
+    match=prefix finds names and emails starting with q, match=substring
+    the ones containing it. role keeps only teachers or only students.
+    Pass the last user_id of a page as `after` to get the next one.
+    """
+    term = q.strip().lower()
+    if not term:
+        raise HTTPException(status_code=400, detail="Search term is required")
+    pattern = _like_escape(term) + "%"
+    if match == "substring":
+        pattern = "%" + pattern
+    # Rendered into the SQL rather than bound: with a bound parameter Postgres
+    # may switch to a generic plan that can't use the pattern indexes
+    pattern = bindparam("pattern", pattern, literal_execute=True)
+
+    teacher_id = select(models.Teacher.id).filter(models.Teacher.user_id == models.User.id).limit(1).scalar_subquery()
+    student_id = select(models.Student.id).filter(models.Student.user_id == models.User.id).limit(1).scalar_subquery()
+    query = (
+        select(models.User.id, models.User.email, models.User.name, teacher_id.label("teacher_id"), student_id.label("student_id"))
+        .filter(or_(
+            func.lower(models.User.name).like(pattern, escape="\\"),
+            func.lower(models.User.email).like(pattern, escape="\\"),
+        ))
+    )
+    if role == "teacher":
+        query = query.filter(exists().where(models.Teacher.user_id == models.User.id))
+    elif role == "student":
+        query = query.filter(exists().where(models.Student.user_id == models.User.id))
+    if after is not None:
+        query = query.filter(models.User.id > after)
+    rows = (await db.execute(query.order_by(models.User.id).limit(limit))).all()
+
+    return [
+        {
+            "user_id": row.id,
+            "email": row.email,
+            "name": row.name,
+            "role": "teacher" if row.teacher_id is not None else "student" if row.student_id is not None else None,
+            "teacher_id": row.teacher_id,
+            "student_id": row.student_id,
+        }
+        for row in rows
+    ]
+
 @router.get("/classes")
-def get_classes(db: Session = Depends(get_db)):
-    classes = db.query(models.Class).all()
-    return [{"id": class_obj.id, "name": class_obj.name} for class_obj in classes]
+async def get_classes(request: Request, db: AsyncSession = Depends(get_db)):
+    async def load():
+        classes = (await db.execute(select(models.Class))).scalars().all()
+        return [{"id": class_obj.id, "name": class_obj.name} for class_obj in classes]
+    return await response_cache.respond(request, "admin:classes", load, tags=("classes",))
 
 @router.get("/subjects")
-def get_subjects(db: Session = Depends(get_db)):
-    subjects = db.query(models.Subject).all()
-    return [{"id": subject.id, "name": subject.name} for subject in subjects]
\ No newline at end of file
+async def get_subjects(request: Request, db: AsyncSession = Depends(get_db)):
+    async def load():
+        subjects = (await db.execute(select(models.Subject))).scalars().all()
+        return [{"id": subject.id, "name": subject.name} for subject in subjects]
+    return await response_cache.respond(request, "admin:subjects", load, tags=("subjects",))
+
+@router.get("/pool-stats")
+async def get_pool_stats():
+    """
+    Return connection pool statistics of the worker that serves the request.
+    """
+    return pool_stats()
+
+@router.get("/grade-stats")
+async def get_grade_stats(db: AsyncSession = Depends(get_db)):
+    """
+    Return score statistics (mean, median, standard deviation, percentiles
+    and a histogram) per class and subject, per subject and for the school.
+    """
+    return await grade_stats.get(db)
+
+@router.get("/leaderboard/{subject_id}")
+async def get_leaderboard(subject_id: int, limit: int = Query(10, ge=1, le=100), db: AsyncSession = Depends(get_db)):
+    """
+    Return the best students of the school in a subject, ties sharing a rank.
+    """
+    count, top = await rankings.top(db, subject_id, None, limit)
+    return {"subject_id": subject_id, "student_count": count, "top": await describe(db, top)}
+
+@router.get("/export/gradebook")
+async def export_gradebook(
+    format: str = Query("csv", regex="^(csv|xlsx)$"),
+    class_id: Optional[int] = None,
+    subject_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Download the gradebook as CSV or XLSX: one row per student, one column
+    per subject. class_id and subject_id narrow it to a class or a subject,
+    without them it covers the whole school. The file is streamed while the
+    rows are read, so its size doesn't affect memory use.
+    """
+    if class_id is not None and not await db.get(models.Class, class_id):
+        raise HTTPException(status_code=404, detail="Class not found")
+    subjects = await load_subjects(db, subject_id)
+    if subject_id is not None and not subjects:
+        raise HTTPException(status_code=404, detail="Subject not found")
+
+    header = FIXED_COLUMNS + [name for _, name in subjects]
+    batches = gradebook_rows(db, subjects, class_id)
+    filename = "gradebook"
+    if class_id is not None:
+        filename += f"-class-{class_id}"
+    if subject_id is not None:
+        filename += f"-subject-{subject_id}"
+    if format == "xlsx":
+        body = stream_xlsx(header, batches)
+        media_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    else:
+        body = stream_csv(header, batches)
+        media_type = "text/csv"
+    return StreamingResponse(
+        body, media_type=media_type, headers={"Content-Disposition": f'attachment; filename="{filename}.{format}"'}
+    )
@@ -0,0 +1,55 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_db
+from app import models
+from app.utils.events import stream
+from app.utils.tokens import authenticate_stream
+
+router = APIRouter()
+
+@router.get("/stream")
+async def event_stream(
+    user_id: Optional[int] = None,
+    class_id: Optional[int] = None,
+    teacher_id: Optional[int] = None,
+    claims: dict = Depends(authenticate_stream),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Server-sent events announcing score and schedule changes, so clients
+    reload only when something changed instead of polling.
+    Subscribe to a student (user_id, as in /students/scores/{user_id}), a
+    class, or a teacher (all classes of the teacher), in any combination.
+    Events: `score` (the student's own new score, only on the student's
+    stream), `scores` (scores of a class changed; no values, as classmates
+    share the class topic), `schedule` (a class's schedule changed),
+    `timetable` (all schedules were regenerated) and `resync` (events were
+    missed, reload everything). Pass the token as access_token if the
+    client can't set the Authorization header.
+    """
+    if user_id is None and class_id is None and teacher_id is None:
+        raise HTTPException(status_code=400, detail="Subscribe to a user_id, class_id or teacher_id")
+    topics = set()
+    if user_id is not None:
+        student = (await db.execute(select(models.Student).filter(models.Student.user_id == user_id))).scalars().first()
+        if not student:
+            raise HTTPException(status_code=404, detail="Student not found")
+        topics.update((f"student:{student.id}", f"class:{student.class_id}"))
+    if class_id is not None:
+        topics.add(f"class:{class_id}")
+    if teacher_id is not None:
+        teacher = await db.get(models.Teacher, teacher_id)
+        if not teacher:
+            raise HTTPException(status_code=404, detail="Teacher not found")
+        class_ids = (await db.execute(select(models.TeacherClass.class_id).filter(models.TeacherClass.teacher_id == teacher_id))).scalars()
+        topics.update(f"class:{c}" for c in class_ids)
+    # The stream may stay open for hours; don't hold a pooled connection meanwhile
+    await db.close()
+    return StreamingResponse(
+        stream(topics),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
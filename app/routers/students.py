@@ -1,43 +1,68 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app.database import SessionLocal
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_db
 from app import models
+from app.utils.cache import response_cache
+from app.utils.rankings import rankings
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @router.post("/register-student")
-def register_student(user_id: int, class_id: int, db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.id == user_id).first()
-    class_obj = db.query(models.Class).filter(models.Class.id == class_id).first()
+async def register_student(user_id: int, class_id: int, db: AsyncSession = Depends(get_db)):
+    user = await db.get(models.User, user_id)
+    class_obj = await db.get(models.Class, class_id)
     if not user or not class_obj:
         raise HTTPException(status_code=404, detail="User or Class not found")
     new_student = models.Student(user_id=user_id, class_id=class_id)
     db.add(new_student)
-    db.commit()
-    db.refresh(new_student)
+    await db.commit()
+    response_cache.invalidate(f"class:{class_id}")
     return {"student_id": new_student.id, "user_id": new_student.user_id, "class_id": new_student.class_id}
 
 @router.get("/scores/{user_id}")
-def get_student_scores(user_id: int, db: Session = Depends(get_db)):
-    student = db.query(models.Student).filter(models.Student.user_id == user_id).first()
+async def get_student_scores(user_id: int, db: AsyncSession = Depends(get_db)):
+    student = (await db.execute(select(models.Student).filter(models.Student.user_id == user_id))).scalars().first()
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
-    # scores = db.query(models.Score).filter(models.Score.student_id == student.id).all()
     # Join the tables to get the subject name
-    scores = db.query(models.Score, models.Subject).join(models.Subject).filter(models.Score.student_id == student.id).all()
+    scores = (await db.execute(select(models.Score, models.Subject).join(models.Subject).filter(models.Score.student_id == student.id))).all()
     return [{"subject": subj.name, "score": score.scores} for score, subj in scores]
 
 @router.get("/schedule/{user_id}")
-def get_student_schedule(user_id: int, db: Session = Depends(get_db)):
-    student = db.query(models.Student).filter(models.Student.user_id == user_id).first()
+async def get_student_schedule(user_id: int, db: AsyncSession = Depends(get_db)):
+    student = (await db.execute(select(models.Student).filter(models.Student.user_id == user_id))).scalars().first()
+    if not student:
+        raise HTTPException(status_code=404, detail="Student not found")
+    schedules = (await db.execute(select(models.Schedule).filter(models.Schedule.class_id == student.class_id))).scalars().all()
+    return [{"time_slot": sch.time_slot, "subject": sch.subject} for sch in schedules]
+
+@router.get("/rank/{user_id}")
+async def get_student_rank(user_id: int, db: AsyncSession = Depends(get_db)):
+    """
+    Return the student's rank in every subject they have a score in,
+    within their class and within the school.
+    """
+    student = (await db.execute(select(models.Student).filter(models.Student.user_id == user_id))).scalars().first()
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
-    schedules = db.query(models.Schedule).filter(models.Schedule.class_id == student.class_id).all()
-    return [{"time_slot": sch.time_slot, "subject": sch.subject} for sch in schedules]
\ No newline at end of file
+    scores = (await db.execute(
+        select(models.Score.subject_id, models.Score.scores, models.Subject.name)
+        .join(models.Subject)
+        .filter(models.Score.student_id == student.id, models.Score.scores.isnot(None))
+        .order_by(models.Score.subject_id)
+    )).all()
+    result = []
+    for row in scores:
+        class_size, class_rank = await rankings.rank(db, row.subject_id, student.class_id, student.id)
+        school_size, school_rank = await rankings.rank(db, row.subject_id, None, student.id)
+        result.append({
+            "subject_id": row.subject_id,
+            "subject": row.name,
+            "score": row.scores,
+            "class_rank": class_rank,
+            "class_size": class_size,
+            "school_rank": school_rank,
+            "school_size": school_size,
+        })
+    return result
@@ -1,125 +1,260 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
-from ..database import SessionLocal
+from decimal import Decimal
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy import select, and_, literal_column, true
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..config import DASHBOARD_CACHE_TTL
+from ..database import get_db
 from .. import models
+from ..utils.scores import parse_score
+from ..utils.score_import import parse_score_rows, import_scores
+from ..utils.analytics import grade_stats
+from ..utils.rankings import rankings, describe
+from ..utils.cache import response_cache
+from ..utils.events import broker
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @router.get("/subject/{teacher_id}")
-def get_subject(teacher_id: int, db: Session = Depends(get_db)):
+async def get_subject(teacher_id: int, request: Request, db: AsyncSession = Depends(get_db)):
     """
     Return the subject of the teacher.
     """
-    teacher = db.query(models.Teacher).filter(models.Teacher.id == teacher_id).first()
-    if not teacher:
-        raise HTTPException(status_code=404, detail="Teacher not found")
-    subject = db.query(models.Subject).filter(models.Subject.id == teacher.subject_id).first()
-    return {"subject_id": subject.id, "subject_name": subject.name}
+    async def load():
+        teacher = await db.get(models.Teacher, teacher_id)
+        if not teacher:
+            raise HTTPException(status_code=404, detail="Teacher not found")
+        subject = await db.get(models.Subject, teacher.subject_id)
+        return {"subject_id": subject.id, "subject_name": subject.name}
+    return await response_cache.respond(request, f"teachers:subject:{teacher_id}", load, tags=("teachers", "subjects"))
 
 @router.get("/classes/{teacher_id}")
-def get_classes(teacher_id: int, db: Session = Depends(get_db)):
+async def get_classes(teacher_id: int, db: AsyncSession = Depends(get_db)):
     """
     Return all classes that the teacher was assigned to.
     """
-    teacher = db.query(models.Teacher).filter(models.Teacher.id == teacher_id).first()
+    teacher = await db.get(models.Teacher, teacher_id)
     if not teacher:
         raise HTTPException(status_code=404, detail="Teacher not found")
-    classes = db.query(models.Class).join(models.TeacherClass).filter(models.TeacherClass.teacher_id == teacher_id).all()
+    classes = (await db.execute(select(models.Class).join(models.TeacherClass).filter(models.TeacherClass.teacher_id == teacher_id))).scalars().all()
     if not classes:
         raise HTTPException(status_code=404, detail="No classes found for this teacher")
     # Return class details
     return [{"class_id": c.id, "class_name": c.name} for c in classes]    
 
 @router.get("/students/{teacher_id}")
-def get_students(teacher_id: int, db: Session = Depends(get_db)):
+async def get_students(teacher_id: int, db: AsyncSession = Depends(get_db)):
     """
     Return all students of all classes that the teacher was assigned to.
     For each Student, also return user details like name, etc.
     """
-    teacher = db.query(models.Teacher).filter(models.Teacher.id == teacher_id).first()
+    teacher = await db.get(models.Teacher, teacher_id)
     if not teacher:
         raise HTTPException(status_code=404, detail="Teacher not found")
 
-    # 1. Find all class assignments for this teacher in teacher_class
-    t_classes = db.query(models.TeacherClass).filter(models.TeacherClass.teacher_id == teacher_id).all()
+    # Classes the teacher was assigned to
+    class_ids = select(models.TeacherClass.class_id).filter(models.TeacherClass.teacher_id == teacher_id)
 
-    # If teacher not found or no assigned classes, return empty list
-    if not t_classes:
-        return []
+    # Fetch the whole roster in one round trip: students joined with their user
+    # and class, plus the score for the teacher's subject when there is one
+    rows = (await db.execute(
+        select(
+            models.Student.id,
+            models.Student.user_id,
+            models.Student.class_id,
+            models.User.id.label("found_user_id"),
+            models.User.name.label("user_name"),
+            models.Class.id.label("found_class_id"),
+            models.Class.name.label("class_name"),
+            models.Score.scores,
+        )
+        .outerjoin(models.User, models.User.id == models.Student.user_id)
+        .outerjoin(models.Class, models.Class.id == models.Student.class_id)
+        .outerjoin(models.Score, and_(models.Score.student_id == models.Student.id, models.Score.subject_id == teacher.subject_id))
+        .filter(models.Student.class_id.in_(class_ids))
+        .order_by(models.Student.id)
+    )).all()
 
-    # 2. Collect all class_ids
-    class_ids = [tc.class_id for tc in t_classes]
-
-    # 3. Find all students whose class_id is in that list
-    students = db.query(models.Student).filter(models.Student.class_id.in_(class_ids)).all()
-
-    # Optionally join on user to get name or email
-    # We'll just do multiple queries below for simplicity:
     result = []
-    for s in students:
-        user = db.query(models.User).filter(models.User.id == s.user_id).first()
-        class_obj = db.query(models.Class).filter(models.Class.id == s.class_id).first()
-        scores = db.query(models.Score).filter(and_(models.Score.student_id == s.id, models.Score.subject_id == teacher.subject_id)).first()
+    for row in rows:
         result.append({
-            "student_id": s.id,
-            "user_id": s.user_id,
-            "student_name": user.name if user else "Unknown",
-            "class_id": s.class_id,
-            "class_name": class_obj.name if class_obj else "Unknown",
-            "score": scores.scores if scores else None,
+            "student_id": row.id,
+            "user_id": row.user_id,
+            "student_name": row.user_name if row.found_user_id is not None else "Unknown",
+            "class_id": row.class_id,
+            "class_name": row.class_name if row.found_class_id is not None else "Unknown",
+            "score": row.scores,
         })
 
     return result
+@router.get("/dashboard/{teacher_id}")
+async def get_dashboard(teacher_id: int, request: Request, db: AsyncSession = Depends(get_db)):
+    """
+    Return the teacher's subject and, for every class of the teacher, the
+    roster with the scores in that subject and the class average.
+    Built from three queries and cached per teacher for a short time.
+    """
+    async def load():
+        found = (await db.execute(
+            select(models.Teacher, models.User.name.label("teacher_name"), models.Subject.name.label("subject_name"))
+            .outerjoin(models.User, models.User.id == models.Teacher.user_id)
+            .outerjoin(models.Subject, models.Subject.id == models.Teacher.subject_id)
+            .filter(models.Teacher.id == teacher_id)
+        )).first()
+        if not found:
+            raise HTTPException(status_code=404, detail="Teacher not found")
+        teacher = found.Teacher
+
+        class_ids = select(models.TeacherClass.class_id).filter(models.TeacherClass.teacher_id == teacher_id)
+        classes = {
+            row.id: {"class_id": row.id, "class_name": row.name, "students": []}
+            for row in await db.execute(
+                select(models.Class.id, models.Class.name).filter(models.Class.id.in_(class_ids)).order_by(models.Class.id)
+            )
+        }
+        rows = await db.execute(
+            select(
+                models.Student.id,
+                models.Student.user_id,
+                models.Student.class_id,
+                models.User.name.label("user_name"),
+                models.Score.scores,
+            )
+            .outerjoin(models.User, models.User.id == models.Student.user_id)
+            .outerjoin(models.Score, and_(models.Score.student_id == models.Student.id, models.Score.subject_id == teacher.subject_id))
+            .filter(models.Student.class_id.in_(class_ids))
+            .order_by(models.Student.id)
+        )
+        for row in rows:
+            classes[row.class_id]["students"].append({
+                "student_id": row.id,
+                "user_id": row.user_id,
+                "student_name": row.user_name or "Unknown",
+                "score": row.scores,
+            })
+
+        for class_data in classes.values():
+            scores = [s["score"] for s in class_data["students"] if s["score"] is not None]
+            class_data["student_count"] = len(class_data["students"])
+            class_data["scored_count"] = len(scores)
+            class_data["average_score"] = (sum(scores) / len(scores)).quantize(Decimal("0.01")) if scores else None
+
+        return {
+            "teacher_id": teacher.id,
+            "teacher_name": found.teacher_name or "Unknown",
+            "subject": {"subject_id": teacher.subject_id, "subject_name": found.subject_name} if found.subject_name else None,
+            "classes": list(classes.values()),
+        }
+
+    def tags(data):
+        return [f"teacher:{teacher_id}"] + [f"class:{c['class_id']}" for c in data["classes"]]
+
+    return await response_cache.respond(
+        request, f"teachers:dashboard:{teacher_id}", load, tags=tags, ttl=DASHBOARD_CACHE_TTL
+    )
+
+@router.get("/rankings/{class_id}/{subject_id}")
+async def get_class_ranking(class_id: int, subject_id: int, limit: int = Query(10, ge=1, le=100), db: AsyncSession = Depends(get_db)):
+    """
+    Return the best students of a class in a subject, ties sharing a rank.
+    """
+    count, top = await rankings.top(db, subject_id, class_id, limit)
+    return {"class_id": class_id, "subject_id": subject_id, "student_count": count, "top": await describe(db, top)}
+
 @router.post("/register-teacher")
-def register_teacher(user_id: int, subject_id: int, db: Session = Depends(get_db)):
+async def register_teacher(user_id: int, subject_id: int, db: AsyncSession = Depends(get_db)):
     """"
     Register a teacher to a subject.
     """
-    user = db.query(models.User).filter(models.User.id == user_id).first()
-    subject = db.query(models.Subject).filter(models.Subject.id == subject_id).first()
+    user = await db.get(models.User, user_id)
+    subject = await db.get(models.Subject, subject_id)
     if not user or not subject:
         raise HTTPException(status_code=404, detail="User or Subject not found")
     new_teacher = models.Teacher(user_id=user_id, subject_id=subject_id)
     db.add(new_teacher)
-    db.commit()
-    db.refresh(new_teacher)
+    await db.commit()
+    response_cache.invalidate("teachers")
     return {"teacher_id": new_teacher.id, "user_id": new_teacher.user_id, "subject_id": new_teacher.subject_id}
 
 @router.post("/add-score")
-def add_score(payload: dict, db: Session = Depends(get_db)):
+async def add_score(payload: dict, db: AsyncSession = Depends(get_db)):
     """"
-    Add a score for a student.
+    Add a score for a student, or replace the one already recorded.
     """
     student_id = payload.get("student_id")
     subject_id = payload.get("subject_id")
     score_value = payload.get("score_value")
     teacher_id = payload.get("teacher_id")
 
-    student = db.query(models.Student).filter(models.Student.id == student_id).first()
-    teacher = db.query(models.Teacher).filter(models.Teacher.id == teacher_id).first()
-    subject = teacher.subject_id
-    if not student or not teacher or not subject:
+    try:
+        student_id, teacher_id = int(student_id), int(teacher_id)
+        subject_id = int(subject_id) if subject_id is not None else None
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="student_id, teacher_id and subject_id must be integers")
+    try:
+        score = parse_score(score_value)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    found = (await db.execute(
+        select(models.Student, models.Teacher)
+        .join(models.Teacher, true())
+        .filter(models.Student.id == student_id, models.Teacher.id == teacher_id)
+    )).first()
+    if not found:
+        raise HTTPException(status_code=404, detail="Student or Subject not found")
+    student, teacher = found
+    subject_id = subject_id or teacher.subject_id
+    if not subject_id:
         raise HTTPException(status_code=404, detail="Student or Subject not found")
-    # Check if the score already exists
-    existing_score = db.query(models.Score).filter(and_(models.Score.student_id == student_id, models.Score.subject_id == subject_id)).first()
-    if existing_score:
-        # Update the existing score
-        existing_score.scores = score_value
-        db.commit()
-        db.refresh(existing_score)
-        return {"message": "Score updated successfully"}
-    else:
-        # Create a new score
-        new_score = models.Score(student_id=student_id, subject_id=subject_id, scores=score_value)
-        db.add(new_score)
-        db.commit()
-        db.refresh(new_score)
-        return {"message": "Score added successfully"}
\ No newline at end of file
+
+    # Insert or update in one statement; xmax is 0 only for a freshly inserted row
+    stmt = insert(models.Score).values(student_id=student_id, subject_id=subject_id, scores=score)
+    stmt = stmt.on_conflict_do_update(
+        constraint="uq_scores_student_subject",
+        set_={"scores": stmt.excluded.scores},
+    ).returning(literal_column("xmax = 0").label("inserted"))
+    try:
+        inserted = (await db.execute(stmt)).scalar()
+        await db.commit()
+    except IntegrityError:
+        # subject_id doesn't reference an existing subject
+        raise HTTPException(status_code=404, detail="Student or Subject not found")
+    grade_stats.invalidate(student.class_id, subject_id)
+    rankings.record(student.class_id, subject_id, student.id, score)
+    response_cache.invalidate(f"class:{student.class_id}")
+    await broker.publish(
+        [f"student:{student.id}"], "score",
+        {"student_id": student.id, "class_id": student.class_id, "subject_id": subject_id, "score": score},
+    )
+    # Classmates share the class topic: tell them scores changed, not which
+    await broker.publish([f"class:{student.class_id}"], "scores", {"class_id": student.class_id, "subject_id": subject_id})
+    if inserted:
+        return {"message": "Score added successfully"}
+    return {"message": "Score updated successfully"}
+
+@router.post("/import-scores/{teacher_id}")
+async def import_scores_file(teacher_id: int, request: Request, db: AsyncSession = Depends(get_db)):
+    """
+    Import scores in the teacher's subject for many students at once.
+    The request body is streamed: CSV (`student_id,score` per line) or, with
+    an NDJSON content type, one {"student_id": ..., "score": ...} per line.
+    Returns the number of imported scores and an error for each rejected line.
+    """
+    teacher = await db.get(models.Teacher, teacher_id)
+    if not teacher:
+        raise HTTPException(status_code=404, detail="Teacher not found")
+    content_type = request.headers.get("content-type", "")
+    ndjson = "ndjson" in content_type or "jsonl" in content_type
+
+    errors = []
+    rows = parse_score_rows(request.stream(), ndjson, errors)
+    result = await import_scores(db, teacher.id, teacher.subject_id, rows)
+    for class_id in result["class_ids"]:
+        grade_stats.invalidate(class_id, teacher.subject_id)
+        rankings.invalidate(class_id, teacher.subject_id)
+        response_cache.invalidate(f"class:{class_id}")
+        await broker.publish([f"class:{class_id}"], "scores", {"class_id": class_id, "subject_id": teacher.subject_id})
+    errors = sorted(errors + result["errors"], key=lambda e: e["line"])
+    return {"imported": result["imported"], "rejected": len(errors), "errors": errors}
@@ -1,27 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from app.database import SessionLocal
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_db
 from app import models, schemas
-from app.utils.auth import hash_password, verify_password, create_access_token
+from app.utils.rate_limit import auth_limiter
+from app.utils.tokens import authenticate, revoke_token
+from app.utils.auth import hash_password, verify_password, password_needs_rehash, create_access_token, PasswordHasherBusy
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @router.post("/register", response_model=schemas.UserOut)
-def register_user(user_data: schemas.UserCreate, db: Session = Depends(get_db)):
-    existing_user = db.query(models.User).filter(models.User.email == user_data.email).first()
+async def register_user(user_data: schemas.UserCreate, request: Request, db: AsyncSession = Depends(get_db)):
+    await auth_limiter.check(request, user_data.email)
+    existing_user = (await db.execute(select(models.User).filter(models.User.email == user_data.email))).scalars().first()
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
-    hashed_pass = hash_password(user_data.password)
+    hashed_pass = await hash_password(user_data.password)
     new_user = models.User(
         email=user_data.email,
         password=hashed_pass,
@@ -30,17 +27,31 @@ def register_user(user_data: schemas.UserCreate, db: Session = Depends(get_db)):
         name=user_data.name
     )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
     return new_user
 
 @router.post("/login", response_model=schemas.Token)
-def login_user(credentials: schemas.UserLogin, db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.email == credentials.email).first()
-    if not user or not verify_password(credentials.password, user.password):
+async def login_user(credentials: schemas.UserLogin, request: Request, db: AsyncSession = Depends(get_db)):
+    await auth_limiter.check(request, credentials.email)
+    user = (await db.execute(select(models.User).filter(models.User.email == credentials.email))).scalars().first()
+    if not user or not await verify_password(credentials.password, user.password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid email or password"
         )
+    if password_needs_rehash(user.password):
+        try:
+            user.password = await hash_password(credentials.password)
+            await db.commit()
+        except PasswordHasherBusy:
+            pass  # Keep the old hash, try again on the next login
     access_token = create_access_token({"user_id": user.id, "role": "user"}, 60)
-    return {"access_token": access_token, "token_type": "bearer"}
\ No newline at end of file
+    return {"access_token": access_token, "token_type": "bearer"}
+
+@router.post("/logout")
+async def logout_user(claims: dict = Depends(authenticate), db: AsyncSession = Depends(get_db)):
+    """
+    Revoke the token the request was made with.
+    """
+    await revoke_token(db, claims)
+    return {"message": "Logged out"}
@@ -0,0 +1,110 @@
+"""
+Production entry point: import the app once, bind the listening socket and
+fork worker processes that serve it with uvicorn.
+
+    python -m app.serve --workers 4 --host 0.0.0.0 --port 8000
+
+Workers are forked after the app is imported, so they start without
+re-importing anything and share the unchanged memory pages. Nothing opens a
+database connection before the fork; each worker builds its own pool on
+first use. A worker that dies is replaced; SIGTERM or SIGINT stops them all.
+"""
+import argparse
+import os
+import signal
+import socket
+import sys
+import time
+import uvicorn
+from app.config import HOST, PORT, WEB_WORKERS
+from app.main import app
+from app.utils.events import broker
+
+# Seconds to wait before replacing a worker that died, so a worker that
+# crashes on boot doesn't turn into a fork loop
+RESPAWN_DELAY = 1.0
+
+
+def _bind(host: str, port: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+class _Server(uvicorn.Server):
+    def handle_exit(self, sig, frame):
+        # uvicorn waits for running responses before it exits; end the event
+        # streams, which would otherwise stay open until the client leaves
+        broker.close_all()
+        super().handle_exit(sig, frame)
+
+
+def _run_worker(sock: socket.socket, args):
+    # Own process group: a Ctrl-C in the terminal reaches only the master,
+    # which then stops every worker exactly once
+    os.setpgid(0, 0)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    config = uvicorn.Config(app, lifespan="on", log_level=args.log_level, access_log=args.access_log)
+    _Server(config).run(sockets=[sock])
+
+
+def _spawn(sock: socket.socket, args) -> int:
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            _run_worker(sock, args)
+            code = 0
+        finally:
+            os._exit(code)
+    return pid
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the API with pre-forked uvicorn workers.")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", type=int, default=WEB_WORKERS)
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--no-access-log", dest="access_log", action="store_false")
+    args = parser.parse_args()
+
+    sock = _bind(args.host, args.port)
+    workers = {_spawn(sock, args) for _ in range(max(args.workers, 1))}
+    print(f"Serving on {args.host}:{args.port} with {len(workers)} workers (master pid {os.getpid()})", flush=True)
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        workers.discard(pid)
+        if not stopping:
+            print(f"Worker {pid} exited with status {status}, starting a new one", file=sys.stderr, flush=True)
+            time.sleep(RESPAWN_DELAY)
+            if not stopping:
+                workers.add(_spawn(sock, args))
+    sock.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+import asyncio
+import time
+from sqlalchemy import select, func, tuple_, type_coerce, Float
+from sqlalchemy.dialects.postgresql import ARRAY, array
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import models
+from app.config import GRADE_STATS_TTL
+
+PERCENTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+HISTOGRAM_BINS = 10  # one bin per point on the 0-10 scale
+
+
+def _stats_columns():
+    score = models.Score.scores
+    # width_bucket puts a perfect 10 in an overflow bucket; fold it into the last bin
+    bucket = func.least(func.width_bucket(score, 0, 10, HISTOGRAM_BINS), HISTOGRAM_BINS)
+    return [
+        func.count(score).label("count"),
+        func.avg(score).label("mean"),
+        func.stddev_pop(score).label("stddev"),
+        func.min(score).label("min"),
+        func.max(score).label("max"),
+        type_coerce(func.percentile_cont(array(PERCENTILES)).within_group(score), ARRAY(Float)).label("percentiles"),
+    ] + [func.count(score).filter(bucket == i).label(f"bin_{i}") for i in range(1, HISTOGRAM_BINS + 1)]
+
+
+def _stats(row) -> dict:
+    percentiles = row.percentiles or [None] * len(PERCENTILES)
+    return {
+        "count": row.count,
+        "mean": float(row.mean) if row.mean is not None else None,
+        "median": percentiles[PERCENTILES.index(0.5)],
+        "stddev": float(row.stddev) if row.stddev is not None else None,
+        "min": row.min,
+        "max": row.max,
+        "percentiles": {f"p{round(p * 100)}": v for p, v in zip(PERCENTILES, percentiles)},
+        "histogram": [getattr(row, f"bin_{i}") for i in range(1, HISTOGRAM_BINS + 1)],
+    }
+
+
+class GradeStatsCache:
+    """
+    Grade statistics per class x subject, per subject and for the whole
+    school. Writes mark the (class, subject) pairs they touched; the next
+    read recomputes only those pairs and their subject rollups.
+    """
+
+    def __init__(self, ttl: float = GRADE_STATS_TTL):
+        self.ttl = ttl
+        self.pairs = {}
+        self.subjects = {}
+        self.school = None
+        self.loaded_at = None
+        self.dirty_pairs = set()
+        self.hits = 0
+        self.misses = 0
+        self._lock = asyncio.Lock()
+
+    def invalidate(self, class_id: int, subject_id: int):
+        self.dirty_pairs.add((class_id, subject_id))
+
+    def _expired(self) -> bool:
+        return self.loaded_at is None or time.monotonic() - self.loaded_at > self.ttl
+
+    async def get(self, db: AsyncSession) -> dict:
+        if self._expired() or self.dirty_pairs:
+            # Concurrent readers wait for one refresh instead of each running their own
+            async with self._lock:
+                if self._expired():
+                    self.misses += 1
+                    await self._load(db, None)
+                elif self.dirty_pairs:
+                    self.misses += 1
+                    await self._load(db, self.dirty_pairs)
+                else:
+                    self.hits += 1
+        else:
+            self.hits += 1
+        return {
+            "classes": sorted(self.pairs.values(), key=lambda s: (s["class_id"], s["subject_id"])),
+            "subjects": sorted(self.subjects.values(), key=lambda s: s["subject_id"]),
+            "school": self.school,
+        }
+
+    async def _load(self, db: AsyncSession, dirty):
+        """
+        Recompute the dirty pairs, or everything when dirty is None. The
+        results are built aside and swapped in once all queries are done, so
+        readers never see a half-refreshed cache.
+        """
+        # Writes that land while the queries run are marked dirty again
+        self.dirty_pairs = set()
+        started_at = time.monotonic()
+
+        pairs_query = (
+            select(
+                models.Student.class_id,
+                models.Class.name.label("class_name"),
+                models.Score.subject_id,
+                models.Subject.name.label("subject_name"),
+                *_stats_columns(),
+            )
+            .join(models.Student, models.Student.id == models.Score.student_id)
+            .join(models.Class, models.Class.id == models.Student.class_id)
+            .join(models.Subject, models.Subject.id == models.Score.subject_id)
+            .filter(models.Score.scores.isnot(None))
+            .group_by(models.Student.class_id, models.Class.name, models.Score.subject_id, models.Subject.name)
+        )
+        subjects_query = (
+            select(models.Score.subject_id, models.Subject.name.label("subject_name"), *_stats_columns())
+            .join(models.Subject, models.Subject.id == models.Score.subject_id)
+            .filter(models.Score.scores.isnot(None))
+            .group_by(models.Score.subject_id, models.Subject.name)
+        )
+        school_query = select(*_stats_columns()).filter(models.Score.scores.isnot(None))
+
+        if dirty is None:
+            pairs, subjects = {}, {}
+        else:
+            dirty_subjects = {subject_id for _, subject_id in dirty}
+            pairs_query = pairs_query.filter(tuple_(models.Student.class_id, models.Score.subject_id).in_(list(dirty)))
+            subjects_query = subjects_query.filter(models.Score.subject_id.in_(dirty_subjects))
+            pairs = {key: stats for key, stats in self.pairs.items() if key not in dirty}
+            subjects = {key: stats for key, stats in self.subjects.items() if key not in dirty_subjects}
+
+        try:
+            for row in (await db.execute(pairs_query)).all():
+                pairs[(row.class_id, row.subject_id)] = {
+                    "class_id": row.class_id,
+                    "class_name": row.class_name,
+                    "subject_id": row.subject_id,
+                    "subject_name": row.subject_name,
+                    **_stats(row),
+                }
+            for row in (await db.execute(subjects_query)).all():
+                subjects[row.subject_id] = {
+                    "subject_id": row.subject_id,
+                    "subject_name": row.subject_name,
+                    **_stats(row),
+                }
+            school = _stats((await db.execute(school_query)).one())
+        except BaseException:
+            # Still stale; the next read tries again
+            if dirty is not None:
+                self.dirty_pairs |= dirty
+            raise
+        self.pairs, self.subjects, self.school = pairs, subjects, school
+        if dirty is None:
+            self.loaded_at = started_at
+
+grade_stats = GradeStatsCache()
@@ -1,19 +1,136 @@
 import jwt
 import bcrypt
+import asyncio
+import multiprocessing
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
+from app.config import BCRYPT_ROUNDS, BCRYPT_WORKERS, BCRYPT_MAX_PENDING, JWT_SECRET_KEY
+from app.utils.stats import Histogram
 
-SECRET_KEY = "MY_SECRET_KEY"
+SECRET_KEY = JWT_SECRET_KEY
 ALGORITHM = "HS256"
 
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return bcrypt.checkpw(plain_password.encode("utf-8"), hashed_password.encode("utf-8"))
+class PasswordHasherBusy(Exception):
+    """Raised when too many password hashes are already queued."""
+
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = threading.BoundedSemaphore(BCRYPT_MAX_PENDING)
+# Hashes a batch (bulk enrollment) may have queued at once: never more than
+# half of BCRYPT_MAX_PENDING, so logins always find a free slot
+BATCH_HASH_LIMIT = min(BCRYPT_WORKERS, max(1, BCRYPT_MAX_PENDING // 2))
+
+# Time from submitting a hash/verify to getting its result, queueing included
+hash_seconds = Histogram()
+verify_seconds = Histogram()
+hasher_busy = 0
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=BCRYPT_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _executor
+
+
+async def _run_in_pool(histogram, fn, *args):
+    """
+    Run fn in the bcrypt process pool without blocking the event loop and
+    record its duration in histogram.
+    Raises PasswordHasherBusy instead of queueing past BCRYPT_MAX_PENDING.
+    """
+    global hasher_busy
+    if not _pending.acquire(blocking=False):
+        hasher_busy += 1
+        raise PasswordHasherBusy()
+    start = time.perf_counter()
+    try:
+        future = _get_executor().submit(fn, *args)
+    except BaseException:
+        _pending.release()
+        raise
+    future.add_done_callback(lambda _: _pending.release())
+    try:
+        return await asyncio.wrap_future(future)
+    finally:
+        histogram.observe(time.perf_counter() - start)
+
+
+def check_hasher_capacity():
+    """
+    Raise PasswordHasherBusy if a hash/verify submitted now would be rejected,
+    so requests can be turned away before doing any other work.
+    """
+    global hasher_busy
+    if not _pending.acquire(blocking=False):
+        hasher_busy += 1
+        raise PasswordHasherBusy()
+    _pending.release()
+
+
+def shutdown_password_hasher():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def _hashpw(password: bytes, rounds: int) -> str:
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds)).decode("utf-8")
+
+
+def _checkpw(password: bytes, hashed_password: bytes) -> bool:
+    return bcrypt.checkpw(password, hashed_password)
+
+
+async def hash_password(password: str) -> str:
+    return await _run_in_pool(hash_seconds, _hashpw, password.encode("utf-8"), BCRYPT_ROUNDS)
+
+async def hash_passwords(passwords: list) -> list:
+    """
+    Hash many passwords in parallel. At most BATCH_HASH_LIMIT of them are in
+    the pool at once, leaving the remaining slots to logins; when those are
+    taken too, the batch waits instead of failing.
+    """
+    limit = asyncio.Semaphore(BATCH_HASH_LIMIT)
+
+    async def hash_one(password: str) -> str:
+        async with limit:
+            while True:
+                try:
+                    return await hash_password(password)
+                except PasswordHasherBusy:
+                    await asyncio.sleep(0.05)
+
+    return await asyncio.gather(*(hash_one(password) for password in passwords))
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await _run_in_pool(verify_seconds, _checkpw, plain_password.encode("utf-8"), hashed_password.encode("utf-8"))
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    """
+    Return True if the hash was made with a cost other than BCRYPT_ROUNDS.
+    """
+    try:
+        rounds = int(hashed_password.split("$")[2])
+    except (IndexError, ValueError):
+        return False
+    return rounds != BCRYPT_ROUNDS
 
 def create_access_token(data: dict, expires_delta: int = 30):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=expires_delta)
-    to_encode.update({"exp": expire})
+    # jti identifies the token so a logout can revoke it
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
\ No newline at end of file
+    return encoded_jwt
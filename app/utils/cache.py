@@ -0,0 +1,113 @@
+import hashlib
+import json
+import time
+from collections import OrderedDict, defaultdict
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from app.config import RESPONSE_CACHE_TTL, RESPONSE_CACHE_SIZE
+
+
+def _etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+class ResponseCache:
+    """
+    In-process cache of rendered JSON responses with TTL and LRU eviction.
+    Entries carry tags, and write endpoints invalidate a tag to drop every
+    response built from the rows they changed.
+    """
+
+    def __init__(self, ttl: float = RESPONSE_CACHE_TTL, max_entries: int = RESPONSE_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (expires_at, body, etag, tags)
+        self._keys_by_tag = defaultdict(set)
+        self._generations = defaultdict(int)
+        self._invalidations = 0
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def set(self, key, body: bytes, tags=(), ttl=None):
+        entry = (time.monotonic() + (self.ttl if ttl is None else ttl), body, _etag(body), tuple(tags))
+        self._remove(key)
+        self._entries[key] = entry
+        for tag in tags:
+            self._keys_by_tag[tag].add(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+        return entry
+
+    def invalidate(self, tag):
+        self._generations[tag] += 1
+        self._invalidations += 1
+        for key in list(self._keys_by_tag.pop(tag, ())):
+            self._remove(key)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            for tag in entry[3]:
+                keys = self._keys_by_tag.get(tag)
+                if keys is not None:
+                    keys.discard(key)
+
+    async def respond(self, request: Request, key, loader, tags=(), ttl=None) -> Response:
+        """
+        Serve key from the cache, calling loader() to build the data on a
+        miss. tags may also be a function returning the tags of the loaded
+        data, and ttl overrides the cache-wide TTL for this entry.
+        Answers 304 when the client already has the current version.
+        """
+        entry = self.get(key)
+        if entry is None:
+            self.misses += 1
+            invalidations = self._invalidations
+            generations = None if callable(tags) else [self._generations[tag] for tag in tags]
+            data = await loader()
+            if callable(tags):
+                tags = tuple(tags(data))
+                # The tags weren't known while loading, so any invalidation counts
+                unchanged = invalidations == self._invalidations
+            else:
+                unchanged = generations == [self._generations[tag] for tag in tags]
+            body = json.dumps(jsonable_encoder(data)).encode("utf-8")
+            if unchanged:
+                entry = self.set(key, body, tags, ttl)
+            else:
+                # A write invalidated these tags while we were loading
+                entry = (None, body, _etag(body), tuple(tags))
+        else:
+            self.hits += 1
+
+        _, body, etag, _ = entry
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and _etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,189 @@
+import json
+from sqlalchemy import select, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import models
+from app.utils.auth import hash_passwords
+from app.utils.score_import import iter_lines
+
+# Rows per INSERT ... VALUES statement; keeps the bind parameters of one
+# statement well below the driver's limit of 32767
+ENROLL_CHUNK_SIZE = 1000
+
+USER_FIELDS = ("email", "password", "name", "gender", "date_of_birth")
+
+
+async def parse_items(request, ndjson: bool, errors: list) -> list:
+    """
+    Return (item number, object) for the enrollment items of a request: a
+    JSON array body or, with an NDJSON content type, one object per line.
+    Items that aren't JSON objects get an error entry instead.
+    """
+    items = []
+    if ndjson:
+        item_no = 0
+        async for raw in iter_lines(request.stream()):
+            item_no += 1
+            line = raw.decode("utf-8", errors="replace").strip()
+            if not line:
+                continue
+            try:
+                items.append((item_no, json.loads(line)))
+            except ValueError as e:
+                errors.append({"item": item_no, "error": f"Invalid JSON: {e}"})
+    else:
+        try:
+            body = json.loads(await request.body())
+        except ValueError as e:
+            raise ValueError(f"Invalid JSON: {e}")
+        if not isinstance(body, list):
+            raise ValueError("Expected a JSON array of items")
+        items = list(enumerate(body, start=1))
+    valid = []
+    for item_no, item in items:
+        if isinstance(item, dict):
+            valid.append((item_no, item))
+        else:
+            errors.append({"item": item_no, "error": "Expected an object"})
+    return valid
+
+
+def _int(item: dict, key: str) -> int:
+    value = item.get(key)
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise ValueError(f"{key} must be an integer")
+    return value
+
+
+def _check_item(item: dict, role: str) -> dict:
+    """Normalize one item, raising ValueError if it is malformed."""
+    checked = {}
+    if "user_id" in item:
+        checked["user_id"] = _int(item, "user_id")
+    else:
+        for key in USER_FIELDS:
+            value = item.get(key)
+            if value is not None and not isinstance(value, str):
+                raise ValueError(f"{key} must be a string")
+            checked[key] = value
+        if not checked["email"] or not checked["password"]:
+            raise ValueError("Either user_id or email and password are required")
+    if role == "student":
+        checked["class_id"] = _int(item, "class_id")
+    else:
+        checked["subject_id"] = _int(item, "subject_id")
+        class_ids = item.get("class_ids", [])
+        if not isinstance(class_ids, list) or not all(isinstance(c, int) and not isinstance(c, bool) for c in class_ids):
+            raise ValueError("class_ids must be a list of integers")
+        checked["class_ids"] = list(dict.fromkeys(class_ids))
+    return checked
+
+
+async def _existing(db: AsyncSession, column, values) -> set:
+    if not values:
+        return set()
+    return set((await db.execute(select(column).filter(column.in_(list(values))))).scalars())
+
+
+async def _insert_returning(db: AsyncSession, model, rows: list, *columns) -> list:
+    returned = []
+    for start in range(0, len(rows), ENROLL_CHUNK_SIZE):
+        chunk = rows[start:start + ENROLL_CHUNK_SIZE]
+        returned.extend((await db.execute(insert(model).values(chunk).returning(*columns))).all())
+    return returned
+
+
+async def enroll(db: AsyncSession, role: str, items: list, errors: list) -> dict:
+    """
+    Enroll ("student" or "teacher") the given items, creating their users
+    when they come with an email and password instead of a user_id.
+
+    Every referenced id is checked with one query per table and every
+    rejected item gets an error entry. The rest are inserted in a single
+    transaction; an IntegrityError means a concurrent change got in first
+    and nothing was inserted.
+    """
+    assignment = models.Student if role == "student" else models.Teacher
+    checked = []
+    for item_no, item in items:
+        try:
+            checked.append((item_no, _check_item(item, role)))
+        except ValueError as e:
+            errors.append({"item": item_no, "error": str(e)})
+
+    user_ids = {item["user_id"] for _, item in checked if "user_id" in item}
+    emails = {item["email"] for _, item in checked if "email" in item}
+    class_ids = {item["class_id"] for _, item in checked if "class_id" in item}
+    class_ids.update(c for _, item in checked for c in item.get("class_ids", ()))
+    subject_ids = {item["subject_id"] for _, item in checked if "subject_id" in item}
+    known_users = await _existing(db, models.User.id, user_ids)
+    enrolled_users = await _existing(db, assignment.user_id, user_ids)
+    taken_emails = await _existing(db, models.User.email, emails)
+    known_classes = await _existing(db, models.Class.id, class_ids)
+    known_subjects = await _existing(db, models.Subject.id, subject_ids)
+    # Release the connection while bcrypt runs; the inserts start a new transaction
+    await db.close()
+
+    accepted = []
+    seen_users, seen_emails = set(), set()
+    for item_no, item in checked:
+        if "user_id" in item:
+            user_id = item["user_id"]
+            if user_id not in known_users:
+                error = f"User {user_id} not found"
+            elif user_id in enrolled_users or user_id in seen_users:
+                error = f"User {user_id} is already a {role}"
+            else:
+                error = None
+                seen_users.add(user_id)
+        elif item["email"] in taken_emails or item["email"] in seen_emails:
+            error = f"Email {item['email']} is already registered"
+        else:
+            error = None
+            seen_emails.add(item["email"])
+        if error is None:
+            missing_classes = [c for c in ([item["class_id"]] if role == "student" else item["class_ids"]) if c not in known_classes]
+            if missing_classes:
+                error = f"Class {missing_classes[0]} not found"
+            elif role == "teacher" and item["subject_id"] not in known_subjects:
+                error = f"Subject {item['subject_id']} not found"
+        if error:
+            errors.append({"item": item_no, "error": error})
+        else:
+            accepted.append((item_no, item))
+
+    new_users = [item for _, item in accepted if "user_id" not in item]
+    hashes = await hash_passwords([item["password"] for item in new_users])
+    user_rows = [
+        {"email": item["email"], "password": hashed, "name": item["name"], "gender": item["gender"], "date_of_birth": item["date_of_birth"]}
+        for item, hashed in zip(new_users, hashes)
+    ]
+    # Map returned rows back by their unique key rather than relying on the
+    # order RETURNING happens to produce
+    created = await _insert_returning(db, models.User, user_rows, models.User.id, models.User.email)
+    created_ids = {email: id for id, email in created}
+    for _, item in accepted:
+        if "user_id" not in item:
+            item["user_id"] = created_ids[item["email"]]
+
+    if role == "student":
+        rows = [{"user_id": item["user_id"], "class_id": item["class_id"]} for _, item in accepted]
+    else:
+        rows = [{"user_id": item["user_id"], "subject_id": item["subject_id"]} for _, item in accepted]
+    assigned = await _insert_returning(db, assignment, rows, assignment.id, assignment.user_id)
+    assigned_ids = {user_id: id for id, user_id in assigned}
+    if role == "teacher":
+        links = [
+            {"teacher_id": assigned_ids[item["user_id"]], "class_id": class_id}
+            for _, item in accepted for class_id in item["class_ids"]
+        ]
+        for start in range(0, len(links), ENROLL_CHUNK_SIZE):
+            await db.execute(insert(models.TeacherClass).values(links[start:start + ENROLL_CHUNK_SIZE]))
+    await db.commit()
+
+    return {
+        "created": [
+            {"item": item_no, "user_id": item["user_id"], f"{role}_id": assigned_ids[item["user_id"]]}
+            for item_no, item in accepted
+        ],
+        "class_ids": sorted({item["class_id"] for _, item in accepted} if role == "student" else ()),
+    }
@@ -0,0 +1,161 @@
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from sqlalchemy.engine import make_url
+from app.config import ASYNC_DATABASE_URL, EVENTS_BACKEND, EVENTS_HEARTBEAT, EVENTS_QUEUE_SIZE
+
+logger = logging.getLogger("app.events")
+
+CHANNEL = "app_events"
+# Topic every subscription includes, for changes that concern everybody
+SCHOOL = "school"
+
+
+class Subscription:
+    """Events waiting to be sent to one client."""
+
+    def __init__(self, topics: set):
+        self.topics = topics
+        self.queue = asyncio.Queue(EVENTS_QUEUE_SIZE)
+        self.overflowed = False
+
+    def close(self):
+        """End the stream after what was already delivered."""
+        while self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+    def deliver(self, kind: str, data: str):
+        try:
+            self.queue.put_nowait((kind, data))
+        except asyncio.QueueFull:
+            # Dropping events silently would leave the client showing stale
+            # data; it is told to reload everything instead
+            self.overflowed = True
+
+
+class Broker:
+    """
+    Fans change events out to the subscriptions of this worker. With the
+    postgres backend events go through NOTIFY first and come back to every
+    worker, this one included, on a dedicated LISTEN connection.
+    """
+
+    def __init__(self):
+        self.subscriptions = defaultdict(set)  # topic -> subscriptions
+        self._conn = None
+        self._conn_lock = asyncio.Lock()
+        self._task = None
+
+    def subscribe(self, topics) -> Subscription:
+        subscription = Subscription(set(topics) | {SCHOOL})
+        for topic in subscription.topics:
+            self.subscriptions[topic].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        for topic in subscription.topics:
+            subscribers = self.subscriptions.get(topic)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self.subscriptions[topic]
+
+    def close_all(self):
+        """End every open stream, so a shutting-down server doesn't wait on them."""
+        for subscription in set().union(*self.subscriptions.values()):
+            subscription.close()
+
+    def subscriber_count(self) -> int:
+        return len(self.subscriptions.get(SCHOOL, ()))
+
+    def dispatch(self, topics, kind: str, data: str):
+        targets = set()
+        for topic in topics:
+            targets.update(self.subscriptions.get(topic, ()))
+        for subscription in targets:
+            subscription.deliver(kind, data)
+
+    async def publish(self, topics, kind: str, event: dict):
+        """Send an event to the subscribers of any of the topics."""
+        topics = list(topics)
+        data = json.dumps(event, default=str)
+        if self._conn is not None:
+            payload = json.dumps({"topics": topics, "kind": kind, "data": data})
+            try:
+                async with self._conn_lock:
+                    await self._conn.execute("SELECT pg_notify($1, $2)", CHANNEL, payload)
+                return
+            except Exception:
+                logger.warning("Could not publish through NOTIFY, delivering to this worker only", exc_info=True)
+        elif EVENTS_BACKEND == "postgres":
+            logger.warning("Event listener not connected, delivering to this worker only")
+        self.dispatch(topics, kind, data)
+
+    def _on_notify(self, connection, pid, channel, payload):
+        try:
+            message = json.loads(payload)
+            self.dispatch(message["topics"], message["kind"], message["data"])
+        except (ValueError, KeyError):
+            logger.warning("Ignoring malformed event %r", payload)
+
+    async def _listen(self):
+        import asyncpg
+        dsn = make_url(ASYNC_DATABASE_URL).set(drivername="postgresql").render_as_string(hide_password=False)
+        while True:
+            conn = None
+            try:
+                conn = await asyncpg.connect(dsn)
+                await conn.add_listener(CHANNEL, self._on_notify)
+                self._conn = conn
+                # A query now and then notices a dropped connection
+                while True:
+                    await asyncio.sleep(EVENTS_HEARTBEAT)
+                    async with self._conn_lock:
+                        await conn.execute("SELECT 1")
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning("Event listener connection lost, reconnecting", exc_info=True)
+            finally:
+                self._conn = None
+                if conn is not None:
+                    conn.terminate()
+            await asyncio.sleep(1)
+
+    def start(self):
+        if EVENTS_BACKEND == "postgres" and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._listen())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+broker = Broker()
+
+
+async def stream(topics):
+    """Server-sent events of the topics, with keep-alive comments while idle."""
+    subscription = broker.subscribe(topics)
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            if subscription.overflowed:
+                subscription.overflowed = False
+                while not subscription.queue.empty():
+                    subscription.queue.get_nowait()
+                yield "event: resync\ndata: {}\n\n"
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), EVENTS_HEARTBEAT)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            if event is None:
+                return
+            kind, data = event
+            yield f"event: {kind}\ndata: {data}\n\n"
+    finally:
+        broker.unsubscribe(subscription)
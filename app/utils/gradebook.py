@@ -0,0 +1,170 @@
+import csv
+import io
+import zipfile
+from typing import Optional
+from xml.sax.saxutils import escape
+from sqlalchemy import select, func, and_
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import models
+
+# Rows fetched per round trip from the server-side cursor; the output is
+# flushed to the client once per batch
+EXPORT_BATCH_SIZE = 2000
+
+FIXED_COLUMNS = ["student_id", "student_name", "class_id", "class_name"]
+
+
+async def load_subjects(db: AsyncSession, subject_id: Optional[int] = None) -> list:
+    """(id, name) of the subjects that become the score columns."""
+    query = select(models.Subject.id, models.Subject.name).order_by(models.Subject.id)
+    if subject_id is not None:
+        query = query.filter(models.Subject.id == subject_id)
+    return [(row.id, row.name) for row in await db.execute(query)]
+
+
+async def gradebook_rows(db: AsyncSession, subjects: list, class_id: Optional[int] = None):
+    """
+    Yield batches of gradebook rows: the student's fixed columns followed by
+    one score (or None) per subject. Rows are read through a server-side
+    cursor ordered by student, so only one batch is held in memory.
+    """
+    subject_ids = [subject_id for subject_id, _ in subjects]
+    position = {subject_id: i for i, subject_id in enumerate(subject_ids)}
+    # One row per student with the scores aggregated into arrays: turning
+    # rows into Python objects costs far more than the query itself
+    scored = models.Score.subject_id.isnot(None)
+    query = (
+        select(
+            models.Student.id,
+            models.User.name,
+            models.Student.class_id,
+            models.Class.name,
+            func.array_agg(aggregate_order_by(models.Score.subject_id, models.Score.subject_id)).filter(scored),
+            func.array_agg(aggregate_order_by(models.Score.scores, models.Score.subject_id)).filter(scored),
+        )
+        .outerjoin(models.User, models.User.id == models.Student.user_id)
+        .outerjoin(models.Class, models.Class.id == models.Student.class_id)
+        .outerjoin(models.Score, and_(models.Score.student_id == models.Student.id, models.Score.subject_id.in_(subject_ids)))
+        .group_by(models.Student.id, models.User.id, models.Class.id)
+        .order_by(models.Student.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    if class_id is not None:
+        query = query.filter(models.Student.class_id == class_id)
+
+    result = await db.stream(query)
+    try:
+        async for partition in result.partitions():
+            batch = []
+            for student_id, student_name, student_class_id, class_name, scored_subjects, scores in partition:
+                row = [student_id, student_name or "Unknown", student_class_id, class_name or "Unknown"]
+                row.extend([None] * len(subject_ids))
+                for subject_id, score in zip(scored_subjects or (), scores or ()):
+                    row[len(FIXED_COLUMNS) + position[subject_id]] = score
+                batch.append(row)
+            yield batch
+    finally:
+        await result.close()
+
+
+async def stream_csv(header: list, batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    yield buffer.getvalue().encode("utf-8")
+    async for batch in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(["" if value is None else value for value in row] for row in batch)
+        yield buffer.getvalue().encode("utf-8")
+
+
+# ------------------------------
+# XLSX: a zip of a few fixed XML parts plus the worksheet, which is written
+# row by row. zipfile writes to an unseekable sink with data descriptors, so
+# every compressed chunk can be sent as soon as it is produced.
+# ------------------------------
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="Gradebook" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+_SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+_SHEET_END = '</sheetData></worksheet>'
+
+
+class _Sink:
+    """Unseekable file object that collects what zipfile writes until it is drained."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+
+def _cell(value) -> str:
+    if value is None:
+        return "<c/>"
+    if isinstance(value, str):
+        return f'<c t="inlineStr"><is><t>{escape(value)}</t></is></c>'
+    return f"<c><v>{value}</v></c>"
+
+
+def _xml_row(row) -> str:
+    return "<row>" + "".join(_cell(value) for value in row) + "</row>"
+
+
+async def stream_xlsx(header: list, batches):
+    sink = _Sink()
+    archive = zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED)
+    archive.writestr("[Content_Types].xml", _CONTENT_TYPES)
+    archive.writestr("_rels/.rels", _ROOT_RELS)
+    archive.writestr("xl/workbook.xml", _WORKBOOK)
+    archive.writestr("xl/_rels/workbook.xml.rels", _WORKBOOK_RELS)
+    with archive.open("xl/worksheets/sheet1.xml", "w") as sheet:
+        sheet.write((_SHEET_START + _xml_row(header)).encode("utf-8"))
+        yield sink.drain()
+        async for batch in batches:
+            sheet.write("".join(_xml_row(row) for row in batch).encode("utf-8"))
+            data = sink.drain()
+            if data:
+                yield data
+        sheet.write(_SHEET_END.encode("utf-8"))
+    archive.close()
+    yield sink.drain()
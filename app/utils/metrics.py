@@ -0,0 +1,237 @@
+import asyncio
+import json
+import os
+import time
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, HistogramMetricFamily
+from app import database
+from app.config import PROMETHEUS_MULTIPROC_DIR, METRICS_FLUSH_INTERVAL
+from app.utils import auth
+from app.utils.analytics import grade_stats
+from app.utils.cache import response_cache
+from app.utils.events import broker
+from app.utils.rate_limit import auth_limiter
+from app.utils.request_stats import route_template
+from app.utils.stats import Histogram
+from app.utils.tokens import token_cache
+
+# (method, route template, status) -> Histogram of request durations.
+# Like every other counter here it is only touched from the event loop
+# thread, so recording a request takes no lock; prometheus_client only
+# formats the values when /metrics is scraped.
+request_seconds = {}
+in_flight = 0
+
+_flush_task = None
+
+
+class MetricsMiddleware:
+    """Record the duration of every request by route template and status."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        global in_flight
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        in_flight += 1
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            in_flight -= 1
+            # Unmatched paths share one label so scanners can't blow up the series count
+            route = route_template(scope) if "endpoint" in scope else "unmatched"
+            key = (scope["method"], route, str(status))
+            histogram = request_seconds.get(key)
+            if histogram is None:
+                histogram = request_seconds[key] = Histogram()
+            histogram.observe(time.perf_counter() - start)
+
+
+def snapshot() -> dict:
+    """All metrics of this worker as plain JSON data."""
+    pool = database.pool_stats()
+    return {
+        "pid": os.getpid(),
+        "requests": [[method, route, status, h.snapshot()] for (method, route, status), h in request_seconds.items()],
+        "in_flight": in_flight,
+        "event_streams": broker.subscriber_count(),
+        "pool": {key: pool[key] for key in ("pool_size", "checked_in", "checked_out", "overflow")},
+        "pool_timeouts": pool["timeouts"],
+        "pool_wait_seconds": pool["wait_seconds"],
+        "bcrypt_seconds": {"hash": auth.hash_seconds.snapshot(), "verify": auth.verify_seconds.snapshot()},
+        "bcrypt_rejected": auth.hasher_busy,
+        "auth_rate_limited": auth_limiter.rejected,
+        "caches": {
+            "response": [response_cache.hits, response_cache.misses],
+            "grade_stats": [grade_stats.hits, grade_stats.misses],
+            "tokens": [token_cache.hits, token_cache.misses],
+        },
+    }
+
+
+# ------------------------------
+# Multiprocess mode: every worker writes its snapshot to
+# PROMETHEUS_MULTIPROC_DIR and /metrics adds up the files of all workers
+# ------------------------------
+def _snapshot_path(pid: int) -> str:
+    return os.path.join(PROMETHEUS_MULTIPROC_DIR, f"metrics_{pid}.json")
+
+
+def write_snapshot():
+    path = _snapshot_path(os.getpid())
+    with open(path + ".tmp", "w") as f:
+        json.dump(snapshot(), f)
+    os.replace(path + ".tmp", path)
+
+
+async def _flush_periodically():
+    while True:
+        await asyncio.sleep(METRICS_FLUSH_INTERVAL)
+        write_snapshot()
+
+
+def start_metrics_flusher():
+    global _flush_task
+    if PROMETHEUS_MULTIPROC_DIR and _flush_task is None:
+        write_snapshot()
+        _flush_task = asyncio.get_running_loop().create_task(_flush_periodically())
+
+
+def stop_metrics_flusher():
+    global _flush_task
+    if _flush_task is not None:
+        _flush_task.cancel()
+        _flush_task = None
+        write_snapshot()
+
+
+def _is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _collect_snapshots() -> list:
+    own = snapshot()
+    if not PROMETHEUS_MULTIPROC_DIR:
+        return [own]
+    snapshots = [own]
+    for name in os.listdir(PROMETHEUS_MULTIPROC_DIR):
+        if not (name.startswith("metrics_") and name.endswith(".json")) or name == f"metrics_{own['pid']}.json":
+            continue
+        try:
+            with open(os.path.join(PROMETHEUS_MULTIPROC_DIR, name)) as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue  # Being replaced, or its worker died mid-write
+    return snapshots
+
+
+def _merge_histograms(histograms) -> dict:
+    merged = {"count": 0, "sum": 0.0, "buckets": {}}
+    for h in histograms:
+        merged["count"] += h["count"]
+        merged["sum"] += h["sum"]
+        for bound, count in h["buckets"].items():
+            merged["buckets"][bound] = merged["buckets"].get(bound, 0) + count
+    return merged
+
+
+def _add_histogram(family, labels, histogram):
+    family.add_metric(labels, list(histogram["buckets"].items()), histogram["sum"])
+
+
+class _SnapshotCollector:
+    """Turn worker snapshots into Prometheus metric families."""
+
+    def __init__(self, snapshots):
+        self.snapshots = snapshots
+        # Gauges of dead workers are dropped, their counters are kept
+        self.live = [s for s in snapshots if s["pid"] == os.getpid() or _is_alive(s["pid"])]
+
+    def collect(self):
+        requests = {}
+        for s in self.snapshots:
+            for method, route, status, h in s["requests"]:
+                requests.setdefault((method, route, status), []).append(h)
+        labels = ["method", "route", "status"]
+        total = CounterMetricFamily("http_requests", "HTTP requests served.", labels=labels)
+        duration = HistogramMetricFamily("http_request_duration_seconds", "HTTP request duration.", labels=labels)
+        for key, histograms in sorted(requests.items()):
+            merged = _merge_histograms(histograms)
+            total.add_metric(list(key), merged["count"])
+            _add_histogram(duration, list(key), merged)
+        yield total
+        yield duration
+
+        yield GaugeMetricFamily(
+            "http_requests_in_flight", "HTTP requests being served.", value=sum(s["in_flight"] for s in self.live)
+        )
+
+        yield GaugeMetricFamily(
+            "event_streams_open", "Server-sent event streams being served.", value=sum(s["event_streams"] for s in self.live)
+        )
+
+        pool = GaugeMetricFamily("db_pool_connections", "Database pool connections by state.", labels=["state"])
+        for state in ("checked_in", "checked_out", "overflow"):
+            pool.add_metric([state], sum(s["pool"][state] for s in self.live))
+        yield pool
+        yield GaugeMetricFamily("db_pool_size", "Configured database pool size.", value=sum(s["pool"]["pool_size"] for s in self.live))
+        yield CounterMetricFamily(
+            "db_pool_timeouts", "Connection checkouts that timed out.", value=sum(s["pool_timeouts"] for s in self.snapshots)
+        )
+        wait = HistogramMetricFamily("db_pool_wait_seconds", "Time spent waiting for a pooled connection.")
+        _add_histogram(wait, [], _merge_histograms(s["pool_wait_seconds"] for s in self.snapshots))
+        yield wait
+
+        bcrypt = HistogramMetricFamily(
+            "bcrypt_duration_seconds", "Password hash/verify duration, queueing included.", labels=["operation"]
+        )
+        for operation in ("hash", "verify"):
+            _add_histogram(bcrypt, [operation], _merge_histograms(s["bcrypt_seconds"][operation] for s in self.snapshots))
+        yield bcrypt
+        yield CounterMetricFamily(
+            "bcrypt_rejected", "Password hash/verify calls rejected because the hasher was busy.",
+            value=sum(s["bcrypt_rejected"] for s in self.snapshots),
+        )
+        yield CounterMetricFamily(
+            "auth_rate_limited", "Login and register attempts rejected by the per-IP and per-email limits.",
+            value=sum(s["auth_rate_limited"] for s in self.snapshots),
+        )
+
+        hits = CounterMetricFamily("cache_hits", "Cache lookups answered from the cache.", labels=["cache"])
+        misses = CounterMetricFamily("cache_misses", "Cache lookups that had to load data.", labels=["cache"])
+        ratio = GaugeMetricFamily("cache_hit_ratio", "Share of cache lookups answered from the cache.", labels=["cache"])
+        for cache in ("response", "grade_stats", "tokens"):
+            cache_hits = sum(s["caches"][cache][0] for s in self.snapshots)
+            cache_misses = sum(s["caches"][cache][1] for s in self.snapshots)
+            hits.add_metric([cache], cache_hits)
+            misses.add_metric([cache], cache_misses)
+            ratio.add_metric([cache], cache_hits / (cache_hits + cache_misses) if cache_hits + cache_misses else 0.0)
+        yield hits
+        yield misses
+        yield ratio
+
+
+def render() -> bytes:
+    """The metrics of this worker, or of all workers in multiprocess mode, in the text format."""
+    registry = CollectorRegistry(auto_describe=False)
+    registry.register(_SnapshotCollector(_collect_snapshots()))
+    return generate_latest(registry)
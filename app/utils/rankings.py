@@ -0,0 +1,209 @@
+import time
+from collections import OrderedDict, defaultdict
+from decimal import Decimal
+from typing import Optional
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import models
+from app.config import RANKINGS_TTL, RANKINGS_MAX_GROUPS
+from app.utils.scores import MIN_SCORE, MAX_SCORE
+
+# One bucket per representable score: 0.00, 0.01, ..., 10.00
+BUCKETS = int(MAX_SCORE * 100) + 1
+_CENT = Decimal("0.01")
+
+
+def _bucket(score) -> int:
+    # Rows written before scores were range checked can hold values
+    # parse_score rejects; they rank at the nearest end of the scale
+    score = min(max(Decimal(score), MIN_SCORE), MAX_SCORE)
+    return int(score.quantize(_CENT) * 100)
+
+
+class ScoreRanking:
+    """
+    Scores of one group of students, ranked highest first with ties sharing
+    a rank (1, 2, 2, 4, ...), like SQL's rank(). A Fenwick tree over the
+    score buckets counts the scores above any value, so changing a score,
+    ranking a student and stepping to the next lower score are all
+    O(log BUCKETS) no matter how many students there are.
+    """
+
+    def __init__(self, rows=()):
+        self._tree = [0] * (BUCKETS + 1)
+        self._members = defaultdict(set)  # bucket -> student ids
+        self._buckets = {}  # student id -> bucket
+        self._scores = {}  # student id -> score
+        for student_id, score in rows:
+            self._members[_bucket(score)].add(student_id)
+            self._buckets[student_id] = _bucket(score)
+            self._scores[student_id] = score
+        # Build the tree in O(BUCKETS) instead of one update per student
+        for bucket, members in self._members.items():
+            self._tree[bucket + 1] += len(members)
+        for i in range(1, BUCKETS + 1):
+            parent = i + (i & -i)
+            if parent <= BUCKETS:
+                self._tree[parent] += self._tree[i]
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def _add(self, bucket: int, delta: int):
+        i = bucket + 1
+        while i <= BUCKETS:
+            self._tree[i] += delta
+            i += i & -i
+
+    def _count_upto(self, bucket: int) -> int:
+        """Number of scores in buckets 0..bucket."""
+        total = 0
+        i = bucket + 1
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def _bucket_of_nth(self, n: int) -> int:
+        """Bucket holding the n-th lowest score (1-based)."""
+        position = 0
+        step = 1 << BUCKETS.bit_length()
+        while step:
+            if position + step <= BUCKETS and self._tree[position + step] < n:
+                position += step
+                n -= self._tree[position]
+            step >>= 1
+        return position  # tree index position + 1 is bucket position
+
+    def set(self, student_id: int, score):
+        """Add or change the student's score; None removes it."""
+        old = self._buckets.pop(student_id, None)
+        self._scores.pop(student_id, None)
+        if old is not None:
+            self._members[old].discard(student_id)
+            self._add(old, -1)
+        if score is not None:
+            bucket = _bucket(score)
+            self._buckets[student_id] = bucket
+            self._scores[student_id] = score
+            self._members[bucket].add(student_id)
+            self._add(bucket, 1)
+
+    def rank(self, student_id: int) -> Optional[int]:
+        bucket = self._buckets.get(student_id)
+        if bucket is None:
+            return None
+        return len(self._buckets) - self._count_upto(bucket) + 1
+
+    def top(self, n: int) -> list:
+        """The n best (rank, student_id, score), ties broken by student id."""
+        result = []
+        below = len(self._buckets)  # scores in buckets up to the one we look at next
+        while below and len(result) < n:
+            bucket = self._bucket_of_nth(below)
+            rank = len(self._buckets) - below + 1
+            members = sorted(self._members[bucket])
+            result.extend((rank, student_id, self._scores[student_id]) for student_id in members[:n - len(result)])
+            below -= len(members)
+        return result
+
+
+class RankingIndex:
+    """
+    Rankings per class x subject and per subject school-wide, built on first
+    use from a window-function query and then kept current by the writes of
+    this worker. Groups are rebuilt after RANKINGS_TTL to pick up writes made
+    through other workers, and at most max_groups are kept.
+    """
+
+    def __init__(self, ttl: float = RANKINGS_TTL, max_groups: int = RANKINGS_MAX_GROUPS):
+        self.ttl = ttl
+        self.max_groups = max_groups
+        self.groups = OrderedDict()  # (subject_id, class_id or None) -> (loaded_at, ScoreRanking), least recently used first
+        self._versions = defaultdict(int)
+
+    def record(self, class_id: int, subject_id: int, student_id: int, score):
+        """Apply one written score to the groups that are loaded."""
+        for key in ((subject_id, class_id), (subject_id, None)):
+            self._versions[key] += 1
+            entry = self.groups.get(key)
+            if entry is not None:
+                entry[1].set(student_id, score)
+
+    def invalidate(self, class_id: int, subject_id: int):
+        """Drop the groups of a class and subject after a bulk write."""
+        for key in ((subject_id, class_id), (subject_id, None)):
+            self._versions[key] += 1
+            self.groups.pop(key, None)
+
+    async def _group(self, db: AsyncSession, subject_id: int, class_id: Optional[int]):
+        """
+        Return (ranking, rows). rows is None when the group was already
+        loaded; on a cold load it holds (student_id, scores, rank) ranked by
+        the database, so the caller can answer from SQL's rank() directly.
+        """
+        key = (subject_id, class_id)
+        entry = self.groups.get(key)
+        if entry is not None and time.monotonic() - entry[0] <= self.ttl:
+            self.groups.move_to_end(key)
+            return entry[1], None
+
+        version = self._versions[key]
+        rank = func.rank().over(order_by=models.Score.scores.desc())
+        query = (
+            select(models.Score.student_id, models.Score.scores, rank.label("rank"))
+            .filter(models.Score.subject_id == subject_id, models.Score.scores.isnot(None))
+            .order_by(rank, models.Score.student_id)
+        )
+        if class_id is not None:
+            query = query.join(models.Student, models.Student.id == models.Score.student_id).filter(models.Student.class_id == class_id)
+        rows = (await db.execute(query)).all()
+        ranking = ScoreRanking((row.student_id, row.scores) for row in rows)
+        # A score written while the query ran may be missing from the rows
+        if version == self._versions[key]:
+            self.groups.pop(key, None)
+            self.groups[key] = (time.monotonic(), ranking)
+            if len(self.groups) > self.max_groups:
+                self.groups.popitem(last=False)
+        return ranking, rows
+
+    async def top(self, db: AsyncSession, subject_id: int, class_id: Optional[int], n: int):
+        """Return (group size, [(rank, student_id, score), ...]) of the n best."""
+        ranking, rows = await self._group(db, subject_id, class_id)
+        if rows is not None:
+            return len(rows), [(row.rank, row.student_id, row.scores) for row in rows[:n]]
+        return len(ranking), ranking.top(n)
+
+    async def rank(self, db: AsyncSession, subject_id: int, class_id: Optional[int], student_id: int):
+        """Return (group size, rank of the student or None)."""
+        ranking, rows = await self._group(db, subject_id, class_id)
+        if rows is not None:
+            return len(rows), next((row.rank for row in rows if row.student_id == student_id), None)
+        return len(ranking), ranking.rank(student_id)
+
+
+rankings = RankingIndex()
+
+
+async def describe(db: AsyncSession, top: list) -> list:
+    """Turn (rank, student_id, score) entries into rows with the student's name and class."""
+    ids = [student_id for _, student_id, _ in top]
+    students = {}
+    if ids:
+        rows = await db.execute(
+            select(models.Student.id, models.Student.class_id, models.User.name)
+            .outerjoin(models.User, models.User.id == models.Student.user_id)
+            .filter(models.Student.id.in_(ids))
+        )
+        students = {row.id: row for row in rows}
+    result = []
+    for rank, student_id, score in top:
+        student = students.get(student_id)
+        result.append({
+            "rank": rank,
+            "student_id": student_id,
+            "student_name": (student.name if student else None) or "Unknown",
+            "class_id": student.class_id if student else None,
+            "score": score,
+        })
+    return result
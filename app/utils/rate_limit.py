@@ -0,0 +1,114 @@
+import logging
+import time
+from collections import OrderedDict
+from fastapi import Request
+from app.config import (
+    AUTH_RATE_LIMIT, AUTH_IP_BURST, AUTH_IP_PER_MINUTE, AUTH_EMAIL_BURST, AUTH_EMAIL_PER_MINUTE,
+    RATE_LIMIT_MAX_KEYS, RATE_LIMIT_REDIS_URL,
+)
+from app.utils import auth
+
+logger = logging.getLogger("app.rate_limit")
+
+
+class RateLimited(Exception):
+    """Raised when a client used up its token bucket."""
+
+    def __init__(self, retry_after: float):
+        self.retry_after = retry_after
+
+
+class MemoryBackend:
+    """Token buckets in the memory of this worker."""
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self.buckets = OrderedDict()  # key -> (tokens, updated)
+
+    async def take(self, key: str, burst: int, per_second: float) -> float:
+        """Take a token; return 0 on success, else the seconds until one is available."""
+        now = time.monotonic()
+        tokens, updated = self.buckets.pop(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated) * per_second)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / per_second
+        self.buckets[key] = (tokens, now)
+        if len(self.buckets) > self.max_keys:
+            self.buckets.popitem(last=False)
+        return wait
+
+
+# Same bucket arithmetic as MemoryBackend, done atomically in Redis on the
+# Redis clock so every worker sees the same buckets
+_TAKE_SCRIPT = """
+local burst = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or burst
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+"""
+
+
+class RedisBackend:
+    """Token buckets shared by all workers through Redis."""
+
+    def __init__(self, url: str):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("RATE_LIMIT_REDIS_URL is set but the redis package is not installed")
+        self.client = redis.from_url(url)
+        self.script = self.client.register_script(_TAKE_SCRIPT)
+
+    async def take(self, key: str, burst: int, per_second: float) -> float:
+        try:
+            return float(await self.script(keys=[f"rate_limit:{key}"], args=[burst, per_second]))
+        except Exception:
+            # An unreachable Redis must not lock everybody out of logging in
+            logger.warning("Rate limit backend unavailable, letting the request through", exc_info=True)
+            return 0.0
+
+
+class AuthLimiter:
+    """
+    Admission control for the endpoints that run bcrypt: a token bucket per
+    client IP and one per email, then a check that the hasher has room.
+    Requests are turned away before they touch the database.
+    """
+
+    def __init__(self, backend, enabled: bool = AUTH_RATE_LIMIT):
+        self.backend = backend
+        self.enabled = enabled
+        self.rejected = 0
+
+    async def check(self, request: Request, email: str):
+        """Raise RateLimited or PasswordHasherBusy if the request must wait."""
+        if self.enabled:
+            ip = request.client.host if request.client else "unknown"
+            for key, burst, per_minute in (
+                (f"ip:{ip}", AUTH_IP_BURST, AUTH_IP_PER_MINUTE),
+                (f"email:{email.strip().lower()}", AUTH_EMAIL_BURST, AUTH_EMAIL_PER_MINUTE),
+            ):
+                wait = await self.backend.take(key, burst, per_minute / 60)
+                if wait > 0:
+                    self.rejected += 1
+                    raise RateLimited(wait)
+        auth.check_hasher_capacity()
+
+
+auth_limiter = AuthLimiter(RedisBackend(RATE_LIMIT_REDIS_URL) if RATE_LIMIT_REDIS_URL else MemoryBackend())
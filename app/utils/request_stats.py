@@ -0,0 +1,113 @@
+import contextvars
+import logging
+import time
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+from starlette.routing import Match
+from app.config import SLOW_QUERY_MS
+
+logger = logging.getLogger("app.slow_query")
+
+# Longest parameter repr written to the slow-query log
+MAX_LOGGED_PARAMETERS = 500
+
+
+class RequestStats:
+    """Database work done while serving one request."""
+
+    __slots__ = ("scope", "queries", "db_seconds")
+
+    def __init__(self, scope=None):
+        self.scope = scope
+        self.queries = 0
+        self.db_seconds = 0.0
+
+    def server_timing(self, handler_seconds: float) -> str:
+        return (
+            f'db;dur={self.db_seconds * 1000:.3f};desc="{self.queries} queries", '
+            f"handler;dur={handler_seconds * 1000:.3f}"
+        )
+
+
+_current = contextvars.ContextVar("request_stats", default=None)
+
+# endpoint function -> route path template, filled on first use
+_route_templates = {}
+
+
+def current_request_stats():
+    """Stats of the request being served, or None outside of a request."""
+    return _current.get()
+
+
+def route_template(scope) -> str:
+    """
+    Path template of the route that handled the request, e.g.
+    /teachers/students/{teacher_id}; the raw path if no route matched.
+    """
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return scope.get("path", "-")
+    template = _route_templates.get(endpoint)
+    if template is None:
+        template = scope.get("path", "-")
+        for route in scope["app"].routes:
+            if getattr(route, "endpoint", None) is endpoint and route.matches(scope)[0] == Match.FULL:
+                template = route.path
+                break
+        _route_templates[endpoint] = template
+    return template
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._query_started
+    stats = _current.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+    if SLOW_QUERY_MS >= 0 and elapsed * 1000 >= SLOW_QUERY_MS:
+        route = route_template(stats.scope) if stats is not None and stats.scope is not None else "-"
+        params = repr(parameters)
+        if len(params) > MAX_LOGGED_PARAMETERS:
+            params = params[:MAX_LOGGED_PARAMETERS] + "..."
+        logger.warning("Slow query (%.1f ms) on %s: %s parameters=%s", elapsed * 1000, route, statement, params)
+
+
+def instrument_engine(sync_engine):
+    """Count and time every statement run through the engine."""
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class RequestStatsMiddleware:
+    """
+    Collect the query count and database time of each request and report
+    them, together with the handler time, in a Server-Timing header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope)
+        token = _current.set(stats)
+        started = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", stats.server_timing(time.perf_counter() - started))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
@@ -0,0 +1,112 @@
+import csv
+import json
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.utils.scores import parse_score
+
+# students.id is a Postgres integer; larger ids would fail the whole COPY
+MAX_STUDENT_ID = 2**31 - 1
+
+# Optional first line of a CSV upload, compared case-insensitively
+CSV_HEADER = ("student_id", "score")
+
+
+async def iter_lines(chunks):
+    """Split a stream of byte chunks into lines."""
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line
+    if buffer:
+        yield buffer
+
+
+async def parse_score_rows(chunks, ndjson: bool, errors: list):
+    """
+    Yield (line, student_id, score) for every valid row of an uploaded
+    gradebook and append an error entry for every invalid one.
+
+    CSV rows are `student_id,score`, optionally below a header line with
+    those two column names.
+    NDJSON rows are objects with "student_id" and "score" keys.
+    """
+    line_no = 0
+    async for raw in iter_lines(chunks):
+        line_no += 1
+        try:
+            line = raw.decode("utf-8").strip()
+            if not line:
+                continue
+            if ndjson:
+                item = json.loads(line)
+                student_id, score = item["student_id"], item["score"]
+            else:
+                fields = next(csv.reader([line]))
+                if line_no == 1 and [f.strip().lower() for f in fields] == list(CSV_HEADER):
+                    continue
+                student_id, score = fields[0], fields[1]
+            student_id = int(student_id)
+            if not 1 <= student_id <= MAX_STUDENT_ID:
+                raise ValueError(f"Invalid student_id {student_id}")
+            yield (line_no, student_id, parse_score(score))
+        except KeyError as e:
+            errors.append({"line": line_no, "error": f"Missing field {e.args[0]!r}"})
+        except IndexError:
+            errors.append({"line": line_no, "error": "Expected student_id,score"})
+        except (ValueError, TypeError) as e:
+            errors.append({"line": line_no, "error": str(e)})
+
+
+async def import_scores(db: AsyncSession, teacher_id: int, subject_id: int, rows) -> dict:
+    """
+    Load rows into a temporary staging table with COPY, then upsert the
+    ones that belong to the teacher's students into scores in one statement.
+    When a student appears more than once, the last row wins.
+    """
+    conn = await db.connection()
+    await conn.execute(text(
+        "CREATE TEMP TABLE score_import (line integer, student_id integer, scores numeric(5, 2)) ON COMMIT DROP"
+    ))
+    raw = await conn.get_raw_connection()
+    await raw.driver_connection.copy_records_to_table(
+        "score_import", records=rows, columns=["line", "student_id", "scores"]
+    )
+
+    params = {"teacher_id": teacher_id, "subject_id": subject_id}
+    unknown = await conn.execute(text("""
+        SELECT i.line, i.student_id
+        FROM score_import i
+        WHERE NOT EXISTS (
+            SELECT 1 FROM students s
+            JOIN teacher_class tc ON tc.class_id = s.class_id AND tc.teacher_id = :teacher_id
+            WHERE s.id = i.student_id
+        )
+        ORDER BY i.line
+    """), params)
+    errors = [
+        {"line": line, "error": f"Student {student_id} is not in any of the teacher's classes"}
+        for line, student_id in unknown
+    ]
+
+    upserted = await conn.execute(text("""
+        WITH upserted AS (
+            INSERT INTO scores (student_id, subject_id, scores)
+            SELECT DISTINCT ON (i.student_id) i.student_id, :subject_id, i.scores
+            FROM score_import i
+            JOIN students s ON s.id = i.student_id
+            JOIN teacher_class tc ON tc.class_id = s.class_id AND tc.teacher_id = :teacher_id
+            ORDER BY i.student_id, i.line DESC
+            ON CONFLICT ON CONSTRAINT uq_scores_student_subject DO UPDATE SET scores = EXCLUDED.scores
+            RETURNING student_id
+        )
+        SELECT s.class_id, count(*) FROM upserted u JOIN students s ON s.id = u.student_id GROUP BY s.class_id
+    """), params)
+    imported_per_class = dict(upserted.all())
+    await db.commit()
+    return {
+        "imported": sum(imported_per_class.values()),
+        "class_ids": sorted(imported_per_class),
+        "errors": errors,
+    }
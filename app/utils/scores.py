@@ -0,0 +1,18 @@
+from decimal import Decimal, InvalidOperation
+
+MIN_SCORE = Decimal("0")
+MAX_SCORE = Decimal("10")
+
+
+def parse_score(value) -> Decimal:
+    """
+    Turn a submitted score (a number or a numeric string) into a Decimal.
+    Raises ValueError if it isn't a number between MIN_SCORE and MAX_SCORE.
+    """
+    try:
+        score = Decimal(str(value).strip())
+    except InvalidOperation:
+        raise ValueError(f"Invalid score: {value!r}")
+    if not score.is_finite() or not MIN_SCORE <= score <= MAX_SCORE:
+        raise ValueError(f"Score must be between {MIN_SCORE} and {MAX_SCORE}")
+    return score.quantize(Decimal("0.01"))
@@ -0,0 +1,222 @@
+import heapq
+import random
+from collections import defaultdict, namedtuple
+
+# One weekly slot in the generated grid; day and slot are 1-based like the
+# values stored in schedules.date and schedules.time_slot
+Placement = namedtuple("Placement", "class_id subject_id teacher_id day slot")
+
+
+class TimetableError(Exception):
+    """Raised when the requested lessons can't possibly fit in the week."""
+
+
+def _lowest_bit(mask: int) -> int:
+    return (mask & -mask).bit_length() - 1
+
+
+def _attempt(groups, n_days, slots_per_day, rng):
+    """
+    One DSATUR pass. Lessons are graph vertices that clash when they share a
+    class or a teacher, and slots are colours. Lessons of the same class,
+    subject and teacher are interchangeable, so they are handled as a group
+    and the most constrained group (fewest free slots) is coloured next.
+    Lessons left without a slot then get one repair try each: a lesson that
+    blocks the slot is moved elsewhere if that frees it.
+    """
+    n_slots = n_days * slots_per_day
+    full = (1 << n_slots) - 1
+    day_masks = [((1 << slots_per_day) - 1) << (d * slots_per_day) for d in range(n_days)]
+
+    class_busy = defaultdict(int)
+    teacher_busy = defaultdict(int)
+    class_day_load = defaultdict(lambda: [0] * n_days)
+    subject_days = defaultdict(lambda: [0] * n_days)
+    groups_by_class = defaultdict(list)
+    groups_by_teacher = defaultdict(list)
+    remaining = [hours for _, _, _, hours in groups]
+    for i, (class_id, _, teacher_id, _) in enumerate(groups):
+        groups_by_class[class_id].append(i)
+        if teacher_id is not None:
+            groups_by_teacher[teacher_id].append(i)
+
+    # Static degree: lessons that compete with this group for slots
+    class_load = defaultdict(int)
+    teacher_load = defaultdict(int)
+    for class_id, _, teacher_id, hours in groups:
+        class_load[class_id] += hours
+        if teacher_id is not None:
+            teacher_load[teacher_id] += hours
+    tiebreak = [rng.random() for _ in groups]
+
+    # Slot bit -> index into lessons, per class and per teacher
+    lessons = []  # [class_id, subject_id, teacher_id, bit]
+    class_at = {}
+    teacher_at = {}
+
+    def busy(class_id, teacher_id):
+        return class_busy[class_id] | (teacher_busy[teacher_id] if teacher_id is not None else 0)
+
+    def occupy(index, bit):
+        class_id, subject_id, teacher_id, _ = lessons[index]
+        lessons[index][3] = bit
+        class_busy[class_id] |= 1 << bit
+        class_at[(class_id, bit)] = index
+        if teacher_id is not None:
+            teacher_busy[teacher_id] |= 1 << bit
+            teacher_at[(teacher_id, bit)] = index
+        class_day_load[class_id][bit // slots_per_day] += 1
+        subject_days[(class_id, subject_id)][bit // slots_per_day] += 1
+
+    def vacate(index):
+        class_id, subject_id, teacher_id, bit = lessons[index]
+        class_busy[class_id] &= ~(1 << bit)
+        del class_at[(class_id, bit)]
+        if teacher_id is not None:
+            teacher_busy[teacher_id] &= ~(1 << bit)
+            del teacher_at[(teacher_id, bit)]
+        class_day_load[class_id][bit // slots_per_day] -= 1
+        subject_days[(class_id, subject_id)][bit // slots_per_day] -= 1
+
+    def pick_slot(class_id, subject_id, free):
+        # Spread a subject over the week, then balance the class's days
+        best = None
+        for d in range(n_days):
+            day_free = free & day_masks[d]
+            if day_free:
+                key = (subject_days[(class_id, subject_id)][d], class_day_load[class_id][d], d)
+                if best is None or key < best[0]:
+                    best = (key, _lowest_bit(day_free))
+        return best[1]
+
+    def priority(i):
+        class_id, _, teacher_id, _ = groups[i]
+        degree = class_load[class_id] + (teacher_load[teacher_id] if teacher_id is not None else 0)
+        return (-busy(class_id, teacher_id).bit_count(), -remaining[i], -degree, tiebreak[i])
+
+    version = [0] * len(groups)
+    heap = [(priority(i), 0, i) for i in range(len(groups)) if remaining[i]]
+    heapq.heapify(heap)
+    stuck = []
+
+    while heap:
+        _, v, i = heapq.heappop(heap)
+        if v != version[i] or not remaining[i]:
+            continue
+        class_id, subject_id, teacher_id, _ = groups[i]
+        free = full & ~busy(class_id, teacher_id)
+        if not free:
+            stuck.extend([(class_id, subject_id, teacher_id)] * remaining[i])
+            remaining[i] = 0
+            continue
+
+        lessons.append([class_id, subject_id, teacher_id, None])
+        occupy(len(lessons) - 1, pick_slot(class_id, subject_id, free))
+        remaining[i] -= 1
+
+        # Only groups sharing the class or the teacher became more constrained
+        affected = set(groups_by_class[class_id])
+        if teacher_id is not None:
+            affected.update(groups_by_teacher[teacher_id])
+        for j in affected:
+            if remaining[j]:
+                version[j] += 1
+                heapq.heappush(heap, (priority(j), version[j], j))
+
+    unplaced = []
+    for class_id, subject_id, teacher_id in stuck:
+        if not _repair(class_id, subject_id, teacher_id, full, lessons, busy, occupy, vacate, class_at, teacher_at):
+            unplaced.append((class_id, subject_id, teacher_id))
+
+    placements = [
+        Placement(class_id, subject_id, teacher_id, bit // slots_per_day + 1, bit % slots_per_day + 1)
+        for class_id, subject_id, teacher_id, bit in lessons
+    ]
+    return placements, unplaced
+
+
+def _repair(class_id, subject_id, teacher_id, full, lessons, busy, occupy, vacate, class_at, teacher_at):
+    """
+    Place a lesson that has no free slot by moving the one lesson that
+    blocks some slot (the class's or the teacher's) to a slot that is free
+    for it. Returns False if no single move helps.
+    """
+    for bit in range(full.bit_length()):
+        blockers = {class_at.get((class_id, bit))}
+        if teacher_id is not None:
+            blockers.add(teacher_at.get((teacher_id, bit)))
+        blockers.discard(None)
+        if len(blockers) != 1:
+            continue
+        blocker = blockers.pop()
+        b_class, _, b_teacher, _ = lessons[blocker]
+        vacate(blocker)
+        target = full & ~busy(b_class, b_teacher) & ~(1 << bit)
+        if target:
+            occupy(blocker, _lowest_bit(target))
+            lessons.append([class_id, subject_id, teacher_id, None])
+            occupy(len(lessons) - 1, bit)
+            return True
+        occupy(blocker, bit)
+    return False
+
+
+def generate_timetable(class_ids, teacher_subjects, assignments, weekly_hours,
+                       days=5, slots_per_day=7, attempts=5, seed=0):
+    """
+    Build a clash-free weekly timetable for the whole school.
+
+    class_ids: ids of the classes to schedule.
+    teacher_subjects: {teacher_id: subject_id}.
+    assignments: (teacher_id, class_id) pairs from teacher_class.
+    weekly_hours: {subject_id: lessons per week} for every class.
+
+    Each class gets weekly_hours[subject] lessons of every subject, taught
+    by a teacher assigned to the class for that subject when there is one
+    (the least loaded if several are). No class and no teacher is ever in
+    two places in the same slot.
+
+    Returns (placements, unplaced, unstaffed): the Placement list, one
+    (class_id, subject_id, teacher_id) per lesson that found no free slot,
+    and the (class_id, subject_id) pairs scheduled without a teacher.
+    """
+    n_slots = days * slots_per_day
+    per_class = sum(weekly_hours.values())
+    if per_class > n_slots:
+        raise TimetableError(f"{per_class} lessons per class don't fit in {n_slots} weekly slots")
+
+    teachers_by_class_subject = defaultdict(list)
+    for teacher_id, class_id in sorted(set(assignments)):
+        subject_id = teacher_subjects.get(teacher_id)
+        if subject_id in weekly_hours:
+            teachers_by_class_subject[(class_id, subject_id)].append(teacher_id)
+
+    groups = []
+    unstaffed = []
+    teacher_hours = defaultdict(int)
+    for class_id in class_ids:
+        for subject_id, hours in sorted(weekly_hours.items()):
+            if hours <= 0:
+                continue
+            candidates = teachers_by_class_subject.get((class_id, subject_id))
+            if candidates:
+                teacher_id = min(candidates, key=lambda t: (teacher_hours[t], t))
+                teacher_hours[teacher_id] += hours
+            else:
+                teacher_id = None
+                unstaffed.append((class_id, subject_id))
+            groups.append((class_id, subject_id, teacher_id, hours))
+
+    overloaded = [t for t, hours in teacher_hours.items() if hours > n_slots]
+    if overloaded:
+        raise TimetableError(f"Teachers {sorted(overloaded)} have more lessons than the {n_slots} weekly slots")
+
+    rng = random.Random(seed)
+    best = None
+    for _ in range(max(attempts, 1)):
+        placements, unplaced = _attempt(groups, days, slots_per_day, rng)
+        if best is None or len(unplaced) < len(best[1]):
+            best = (placements, unplaced)
+        if not unplaced:
+            break
+    return best[0], best[1], unstaffed
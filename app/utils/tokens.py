@@ -0,0 +1,162 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Optional
+import jwt
+from fastapi import Depends, HTTPException, Query, status
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from sqlalchemy import select, delete
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import models
+from app.config import TOKEN_CACHE_SIZE, TOKEN_REVOCATION_SYNC_INTERVAL
+from app.database import SessionLocal
+from app.utils.auth import SECRET_KEY, ALGORITHM
+
+logger = logging.getLogger("app.tokens")
+
+
+class TokenCache:
+    """
+    Claims of tokens whose signature was already verified, least recently
+    used first. Entries are dropped once the token expires.
+    """
+
+    def __init__(self, size: int = TOKEN_CACHE_SIZE):
+        self.size = size
+        self.tokens = OrderedDict()  # token -> claims
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str) -> Optional[dict]:
+        claims = self.tokens.get(token)
+        if claims is None or claims["exp"] <= time.time():
+            if claims is not None:
+                del self.tokens[token]
+            self.misses += 1
+            return None
+        self.tokens.move_to_end(token)
+        self.hits += 1
+        return claims
+
+    def put(self, token: str, claims: dict):
+        self.tokens[token] = claims
+        if len(self.tokens) > self.size:
+            self.tokens.popitem(last=False)
+
+
+token_cache = TokenCache()
+
+# jti -> exp of every revoked token that hasn't expired yet. Logouts through
+# this worker are added at once; the background sync reloads the table so
+# logouts through other workers show up as well.
+revoked = {}
+_sync_task = None
+
+_bearer = HTTPBearer(auto_error=False)
+
+
+def _unauthorized(detail: str) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=detail, headers={"WWW-Authenticate": "Bearer"})
+
+
+async def authenticate(credentials: Optional[HTTPAuthorizationCredentials] = Depends(_bearer)) -> dict:
+    """
+    Return the claims of the request's bearer token.
+    Raises 401 if it is missing, invalid, expired or revoked.
+    """
+    if credentials is None:
+        raise _unauthorized("Not authenticated")
+    return verify_token(credentials.credentials)
+
+
+async def authenticate_stream(
+    access_token: Optional[str] = Query(None),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(_bearer),
+) -> dict:
+    """
+    Like authenticate, but also takes the token from the access_token query
+    parameter: browsers can't set headers on an EventSource.
+    """
+    if credentials is not None:
+        return verify_token(credentials.credentials)
+    if access_token:
+        return verify_token(access_token)
+    raise _unauthorized("Not authenticated")
+
+
+def verify_token(token: str) -> dict:
+    claims = token_cache.get(token)
+    if claims is None:
+        try:
+            claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM], options={"require": ["exp", "jti", "role"]})
+        except jwt.PyJWTError:
+            raise _unauthorized("Invalid or expired token")
+        token_cache.put(token, claims)
+    if claims["jti"] in revoked:
+        raise _unauthorized("Token has been revoked")
+    return claims
+
+
+def require_role(*roles: str):
+    """Dependency that authenticates the request and allows only the given roles."""
+
+    async def check_role(claims: dict = Depends(authenticate)) -> dict:
+        if claims["role"] not in roles:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not allowed")
+        return claims
+
+    return check_role
+
+
+require_admin = require_role("admin")
+# Teachers and students log in as "user"; admins may use their routes too
+require_user = require_role("user", "admin")
+
+
+async def revoke_token(db: AsyncSession, claims: dict):
+    """Revoke a token until it expires, for every worker."""
+    now = int(time.time())
+    await db.execute(
+        insert(models.RevokedToken).values(jti=claims["jti"], expires_at=claims["exp"]).on_conflict_do_nothing()
+    )
+    await db.execute(delete(models.RevokedToken).where(models.RevokedToken.expires_at < now))
+    await db.commit()
+    revoked[claims["jti"]] = claims["exp"]
+
+
+async def _load_revoked():
+    global revoked
+    now = int(time.time())
+    async with SessionLocal() as db:
+        rows = (await db.execute(
+            select(models.RevokedToken.jti, models.RevokedToken.expires_at).where(models.RevokedToken.expires_at >= now)
+        )).all()
+    # Merge rather than replace: a logout through this worker may have been
+    # committed after the query started
+    revoked = {jti: expires_at for jti, expires_at in revoked.items() if expires_at >= now}
+    revoked.update(rows)
+
+
+async def _sync_periodically():
+    while True:
+        try:
+            await _load_revoked()
+        except Exception:
+            # Keep the revocations we have; the next round tries again
+            logger.warning("Could not reload revoked tokens", exc_info=True)
+        await asyncio.sleep(TOKEN_REVOCATION_SYNC_INTERVAL)
+
+
+def start_revocation_sync():
+    global _sync_task
+    if _sync_task is None:
+        _sync_task = asyncio.get_running_loop().create_task(_sync_periodically())
+
+
+def stop_revocation_sync():
+    global _sync_task
+    if _sync_task is not None:
+        _sync_task.cancel()
+        _sync_task = None
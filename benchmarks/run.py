@@ -0,0 +1,355 @@
+"""
+Load-test the API with scripted workloads and write a JSON report.
+
+    python -m benchmarks.run --scale 1 --requests 500 --output bench.json
+    python -m benchmarks.run --output new.json --baseline bench.json
+    python -m benchmarks.run --url http://127.0.0.1:8000 --no-seed
+
+Without --url the app runs in-process through httpx's ASGI transport. With
+--url requests go to a running server, which must use the same DATABASE_URL
+as this script; start it with AUTH_RATE_LIMIT=false to measure the login
+workload rather than the rate limiter. Queries per request are read from the
+Server-Timing header.
+The report also times how long a fresh `python -m app.serve` takes to answer
+/healthz and /readyz.
+
+Seeding WIPES the database at DATABASE_URL (see seed.py).
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import re
+import socket
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from contextlib import AsyncExitStack
+from datetime import datetime, timezone
+
+import httpx
+from sqlalchemy import select
+
+import seed
+from app import models
+from app.database import sync_engine
+
+DEFAULT_REQUESTS = 200
+DEFAULT_CONCURRENCY = 16
+DEFAULT_WARMUP = 10
+COLD_START_TIMEOUT = 60
+
+_SERVER_TIMING_QUERIES = re.compile(r'db;[^,]*desc="(\d+) queries"')
+
+
+def load_dataset():
+    """Ids of the seeded rows the workloads pick from."""
+    with sync_engine.connect() as conn:
+        students = conn.execute(
+            select(models.Student.id, models.Student.user_id, models.Student.class_id, models.User.email)
+            .join(models.User, models.User.id == models.Student.user_id)
+            .order_by(models.Student.id)
+        ).all()
+        assignments = conn.execute(
+            select(models.TeacherClass.teacher_id, models.TeacherClass.class_id, models.Teacher.subject_id)
+            .join(models.Teacher, models.Teacher.id == models.TeacherClass.teacher_id)
+            .order_by(models.TeacherClass.id)
+        ).all()
+    if not students or not assignments:
+        raise SystemExit("The database has no students or teacher assignments; run without --no-seed")
+    class_students = defaultdict(list)
+    for student in students:
+        class_students[student.class_id].append(student)
+    return {
+        "students": students,
+        "assignments": [a for a in assignments if class_students[a.class_id]],
+        "teacher_ids": sorted({a.teacher_id for a in assignments}),
+        "class_students": class_students,
+    }
+
+
+# ------------------------------
+# WORKLOADS
+# Each returns (endpoint, method, path, json body) for the next request
+# ------------------------------
+def login_storm(rng, data):
+    student = rng.choice(data["students"])
+    return "POST /users/login", "POST", "/users/login", {"email": student.email, "password": seed.DEFAULT_PASSWORD}
+
+
+def teacher_rosters(rng, data):
+    teacher_id = rng.choice(data["teacher_ids"])
+    view = rng.choice(["students", "classes", "dashboard"])
+    return f"GET /teachers/{view}/{{teacher_id}}", "GET", f"/teachers/{view}/{teacher_id}", None
+
+
+def score_entry(rng, data):
+    assignment = rng.choice(data["assignments"])
+    student = rng.choice(data["class_students"][assignment.class_id])
+    body = {
+        "teacher_id": assignment.teacher_id,
+        "student_id": student.id,
+        "subject_id": assignment.subject_id,
+        "score_value": rng.randint(0, 40) / 4,
+    }
+    return "POST /teachers/add-score", "POST", "/teachers/add-score", body
+
+
+def student_lookups(rng, data):
+    user_id = rng.choice(data["students"]).user_id
+    if rng.random() < 0.5:
+        return "GET /students/scores/{user_id}", "GET", f"/students/scores/{user_id}", None
+    return "GET /students/schedule/{user_id}", "GET", f"/students/schedule/{user_id}", None
+
+
+def admin_views(rng, data):
+    return rng.choice([
+        ("GET /admin/teachers", "GET", "/admin/teachers", None),
+        ("GET /admin/classes", "GET", "/admin/classes", None),
+        ("GET /admin/subjects", "GET", "/admin/subjects", None),
+        ("GET /admin/grade-stats", "GET", "/admin/grade-stats", None),
+    ])
+
+
+WORKLOADS = {
+    "login": login_storm,
+    "rosters": teacher_rosters,
+    "scores": score_entry,
+    "lookups": student_lookups,
+    "admin": admin_views,
+}
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, round(p / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples, seconds):
+    latencies = sorted(s[0] for s in samples)
+    queries = [s[2] for s in samples if s[2] is not None]
+    statuses = defaultdict(int)
+    for s in samples:
+        statuses[str(s[1])] += 1
+    return {
+        "requests": len(samples),
+        "errors": sum(1 for s in samples if s[1] >= 400),
+        "status": dict(sorted(statuses.items())),
+        "throughput": round(len(samples) / seconds, 2) if seconds else None,
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "max_ms": round(latencies[-1] * 1000, 3),
+        "queries_per_request": round(sum(queries) / len(queries), 2) if queries else None,
+    }
+
+
+async def log_in(client, data) -> dict:
+    """Authorization headers for the admin routes and for the teacher/student routes."""
+    headers = {}
+    for role, path, email in (
+        ("admin", "/admin/login", seed.DEFAULT_ADMIN_EMAIL),
+        ("user", "/users/login", data["students"][0].email),
+    ):
+        response = await client.post(path, json={"email": email, "password": seed.DEFAULT_PASSWORD})
+        if response.status_code != 200:
+            raise SystemExit(f"Could not log in as {email}: {response.status_code} {response.text}")
+        headers[role] = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    return headers
+
+
+async def run_workload(client, workload, data, auth, requests, concurrency, warmup, rng_seed):
+    """Send `requests` requests from `concurrency` concurrent clients, after `warmup` unrecorded ones."""
+    rng = random.Random(rng_seed)
+    plan = [workload(rng, data) for _ in range(warmup + requests)]
+    samples = defaultdict(list)
+    next_index = 0
+
+    async def send(endpoint, method, path, body):
+        started = time.perf_counter()
+        headers = auth["admin"] if path.startswith("/admin/") else auth["user"]
+        response = await client.request(method, path, json=body, headers=headers)
+        elapsed = time.perf_counter() - started
+        match = _SERVER_TIMING_QUERIES.search(response.headers.get("server-timing", ""))
+        return elapsed, response.status_code, int(match.group(1)) if match else None
+
+    async def worker(record):
+        nonlocal next_index
+        while next_index < len(plan):
+            endpoint, method, path, body = plan[next_index]
+            next_index += 1
+            elapsed, status_code, queries = await send(endpoint, method, path, body)
+            if record:
+                samples[endpoint].append((elapsed, status_code, queries))
+
+    plan, measured = plan[:warmup], plan[warmup:]
+    await asyncio.gather(*(worker(False) for _ in range(concurrency)))
+    plan, next_index = measured, 0
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(True) for _ in range(concurrency)))
+    seconds = time.perf_counter() - started
+
+    all_samples = [s for endpoint_samples in samples.values() for s in endpoint_samples]
+    report = summarize(all_samples, seconds)
+    report["seconds"] = round(seconds, 3)
+    report["endpoints"] = {endpoint: summarize(s, seconds) for endpoint, s in sorted(samples.items())}
+    return report
+
+
+def measure_cold_start(workers: int = 1) -> dict:
+    """
+    Start `python -m app.serve` in a fresh interpreter and time how long it
+    takes until /healthz and then /readyz first answer 200.
+    """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    url = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "app.serve", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        stdout=subprocess.DEVNULL,
+    )
+    result = {"workers": workers, "healthz_seconds": None, "readyz_seconds": None}
+    try:
+        with httpx.Client(base_url=url, timeout=5) as client:
+            while time.perf_counter() - started < COLD_START_TIMEOUT:
+                if server.poll() is not None:
+                    raise SystemExit(f"app.serve exited with status {server.returncode} during cold start")
+                check = "healthz" if result["healthz_seconds"] is None else "readyz"
+                try:
+                    ok = client.get(f"/{check}").status_code == 200
+                except httpx.TransportError:
+                    ok = False
+                if ok:
+                    result[f"{check}_seconds"] = round(time.perf_counter() - started, 3)
+                    if check == "readyz":
+                        break
+                else:
+                    time.sleep(0.01)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    return result
+
+
+def compare(report, baseline):
+    """Print the change of every endpoint against a baseline report."""
+    print(f"\n{'endpoint':<44}{'metric':<12}{'baseline':>12}{'current':>12}{'change':>10}")
+    for metric in ("healthz_seconds", "readyz_seconds"):
+        before = (baseline.get("cold_start") or {}).get(metric)
+        after = (report.get("cold_start") or {}).get(metric)
+        if before and after:
+            print(f"{'cold start':<44}{metric[:-8]:<12}{before:>12}{after:>12}{(after - before) / before * 100:>+9.1f}%")
+    for name, workload in report["workloads"].items():
+        old_workload = baseline.get("workloads", {}).get(name)
+        if not old_workload:
+            continue
+        for endpoint, stats in workload["endpoints"].items():
+            old = old_workload["endpoints"].get(endpoint)
+            if not old:
+                continue
+            for metric in ("throughput", "p50_ms", "p95_ms", "p99_ms", "queries_per_request"):
+                before, after = old.get(metric), stats.get(metric)
+                if before is None or after is None:
+                    continue
+                change = f"{(after - before) / before * 100:+.1f}%" if before else "-"
+                print(f"{endpoint:<44}{metric:<12}{before:>12}{after:>12}{change:>10}")
+
+
+async def benchmark(args):
+    data = load_dataset()
+    stack = AsyncExitStack()
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=60)
+    else:
+        from app.main import app
+        from app.utils.rate_limit import auth_limiter
+        # Every request comes from this one client, so the per-IP and
+        # per-email buckets would only measure the limiter
+        auth_limiter.enabled = args.rate_limit
+        await stack.enter_async_context(app.router.lifespan_context(app))
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark", timeout=60)
+
+    report = {
+        "meta": {
+            "started": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "target": args.url or "in-process",
+            "scale": args.scale,
+            "seed": args.seed,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "warmup": args.warmup,
+            "students": len(data["students"]),
+            "python": platform.python_version(),
+        },
+        "cold_start": None,
+        "workloads": {},
+    }
+    async with stack:
+        async with client:
+            auth = await log_in(client, data)
+            for name in args.workloads:
+                print(f"Running {name}...")
+                result = await run_workload(
+                    client, WORKLOADS[name], data, auth, args.requests, args.concurrency, args.warmup, args.seed
+                )
+                report["workloads"][name] = result
+                print(f"  {result['throughput']} req/s, p50 {result['p50_ms']} ms, "
+                      f"p99 {result['p99_ms']} ms, {result['errors']} errors")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the API and write a JSON report.")
+    parser.add_argument("--url", help="base URL of a running server (default: run the app in-process)")
+    parser.add_argument("--scale", type=float, default=1.0, help="dataset scale passed to seed.py")
+    parser.add_argument("--seed", type=int, default=seed.DEFAULT_SEED, help="seed for the dataset and the request mix")
+    parser.add_argument("--no-seed", action="store_true", help="use the data already in the database")
+    parser.add_argument("--requests", type=int, default=DEFAULT_REQUESTS, help="measured requests per workload")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="concurrent clients")
+    parser.add_argument("--warmup", type=int, default=DEFAULT_WARMUP, help="unmeasured requests per workload")
+    parser.add_argument("--workloads", default=",".join(WORKLOADS),
+                        help=f"comma separated workloads to run (default: {','.join(WORKLOADS)})")
+    parser.add_argument("--output", default="benchmark.json", help="where to write the JSON report")
+    parser.add_argument("--baseline", help="JSON report of an earlier run to compare against")
+    parser.add_argument("--rate-limit", action="store_true",
+                        help="keep the login rate limits on when running in-process")
+    parser.add_argument("--no-cold-start", dest="measure_cold_start", action="store_false",
+                        help="skip timing the start of a fresh app.serve process")
+    args = parser.parse_args()
+
+    args.workloads = [name.strip() for name in args.workloads.split(",") if name.strip()]
+    unknown = set(args.workloads) - set(WORKLOADS)
+    if unknown:
+        parser.error(f"unknown workloads: {', '.join(sorted(unknown))}")
+
+    if not args.no_seed:
+        seed.seed_database(args.scale, args.seed)
+
+    cold_start = None
+    if args.measure_cold_start:
+        print("Measuring cold start...")
+        cold_start = measure_cold_start()
+        print(f"  healthz after {cold_start['healthz_seconds']} s, readyz after {cold_start['readyz_seconds']} s")
+
+    report = asyncio.run(benchmark(args))
+    report["cold_start"] = cold_start
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,7 @@ from alembic import context
 
 
 # Your app's models import
+from app.config import DATABASE_URL
 from app.database import Base 
 from app import models  # ensure models are imported so metadata is available
 
@@ -15,6 +16,9 @@ config = context.config
 # This line sets up loggers basically.
 fileConfig(config.config_file_name)
 
+# Use the same database as the app (DATABASE_URL from the environment or .env)
+config.set_main_option("sqlalchemy.url", DATABASE_URL)
+
 # add your model's MetaData object here
 # for 'autogenerate' support
 target_metadata = Base.metadata
@@ -0,0 +1,42 @@
+"""index foreign keys
+
+Revision ID: 7cb58483dbd2
+Revises: e4a236ef379a
+Create Date: 2026-10-18 10:03:27.840215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7cb58483dbd2'
+down_revision = 'e4a236ef379a'
+branch_labels = None
+depends_on = None
+
+# scores.student_id is already covered by uq_scores_student_subject
+INDEXES = [
+    ('ix_students_user_id', 'students', ['user_id']),
+    ('ix_students_class_id', 'students', ['class_id']),
+    ('ix_teachers_user_id', 'teachers', ['user_id']),
+    ('ix_teachers_subject_id', 'teachers', ['subject_id']),
+    ('ix_teacher_class_teacher_id_class_id', 'teacher_class', ['teacher_id', 'class_id']),
+    ('ix_teacher_class_class_id_teacher_id', 'teacher_class', ['class_id', 'teacher_id']),
+    ('ix_scores_subject_id_student_id', 'scores', ['subject_id', 'student_id']),
+    ('ix_schedules_class_id_date_time_slot', 'schedules', ['class_id', 'date', 'time_slot']),
+]
+
+
+def upgrade() -> None:
+    # CREATE INDEX CONCURRENTLY doesn't lock out writes but can't run
+    # inside a transaction
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
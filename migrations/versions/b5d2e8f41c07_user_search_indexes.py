@@ -0,0 +1,57 @@
+"""user search indexes
+
+Revision ID: b5d2e8f41c07
+Revises: 7cb58483dbd2
+Create Date: 2026-10-18 14:31:05.118402
+
+"""
+import logging
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5d2e8f41c07'
+down_revision = '7cb58483dbd2'
+branch_labels = None
+depends_on = None
+
+log = logging.getLogger("alembic.runtime.migration")
+
+# lower(col) LIKE 'abc%' can use a btree index with text_pattern_ops
+PREFIX_INDEXES = [
+    ('ix_users_lower_email_pattern', 'lower(email) text_pattern_ops'),
+    ('ix_users_lower_name_pattern', 'lower(name) text_pattern_ops'),
+]
+# lower(col) LIKE '%abc%' needs a trigram GIN index
+TRIGRAM_INDEXES = [
+    ('ix_users_lower_email_trgm', 'lower(email) gin_trgm_ops'),
+    ('ix_users_lower_name_trgm', 'lower(name) gin_trgm_ops'),
+]
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return  # Other databases run the same search without these indexes
+
+    has_trgm = bind.execute(sa.text("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")).scalar()
+    if has_trgm:
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    else:
+        log.warning("pg_trgm is not installed on this server; substring user search will scan the table")
+
+    with op.get_context().autocommit_block():
+        for name, expression in PREFIX_INDEXES:
+            op.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON users ({expression})')
+        if has_trgm:
+            for name, expression in TRIGRAM_INDEXES:
+                op.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON users USING gin ({expression})')
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    with op.get_context().autocommit_block():
+        for name, _ in reversed(PREFIX_INDEXES + TRIGRAM_INDEXES):
+            op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
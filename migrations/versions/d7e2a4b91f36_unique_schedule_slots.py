@@ -0,0 +1,44 @@
+"""unique schedule slots
+
+Revision ID: d7e2a4b91f36
+Revises: c3f1a9d27e54
+Create Date: 2026-10-18 18:21:37.604118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7e2a4b91f36'
+down_revision = 'c3f1a9d27e54'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # A class has one lesson per slot; keep the newest of any duplicates
+    op.execute("""
+        DELETE FROM schedules a
+        USING schedules b
+        WHERE a.class_id = b.class_id
+          AND a.date = b.date
+          AND a.time_slot = b.time_slot
+          AND a.id < b.id
+    """)
+    # The unique index replaces the plain one on the same columns
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'uq_schedules_class_id_date_time_slot', 'schedules', ['class_id', 'date', 'time_slot'],
+            unique=True, postgresql_concurrently=True,
+        )
+        op.drop_index('ix_schedules_class_id_date_time_slot', table_name='schedules', postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_schedules_class_id_date_time_slot', 'schedules', ['class_id', 'date', 'time_slot'],
+            postgresql_concurrently=True,
+        )
+        op.drop_index('uq_schedules_class_id_date_time_slot', table_name='schedules', postgresql_concurrently=True)
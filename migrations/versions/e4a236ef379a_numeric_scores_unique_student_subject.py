@@ -0,0 +1,46 @@
+"""numeric scores, unique student/subject
+
+Revision ID: e4a236ef379a
+Revises: 66cc6f7da368
+Create Date: 2026-10-18 09:12:41.513072
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4a236ef379a'
+down_revision = '66cc6f7da368'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Keep only the newest score of each student in each subject
+    op.execute("""
+        DELETE FROM scores a
+        USING scores b
+        WHERE a.student_id = b.student_id
+          AND a.subject_id = b.subject_id
+          AND a.id < b.id
+    """)
+    # Convert the stored text to numbers; anything that isn't a plain
+    # decimal number becomes NULL
+    op.alter_column(
+        'scores', 'scores',
+        existing_type=sa.String(),
+        type_=sa.Numeric(5, 2),
+        postgresql_using="CASE WHEN trim(scores) ~ '^[0-9]{1,3}(\\.[0-9]+)?$' THEN trim(scores)::numeric(5, 2) END",
+    )
+    op.create_unique_constraint('uq_scores_student_subject', 'scores', ['student_id', 'subject_id'])
+
+
+def downgrade() -> None:
+    op.drop_constraint('uq_scores_student_subject', 'scores', type_='unique')
+    op.alter_column(
+        'scores', 'scores',
+        existing_type=sa.Numeric(5, 2),
+        type_=sa.String(),
+        postgresql_using='scores::text',
+    )
@@ -1,7 +1,7 @@
 """create initial tables
 
 Revision ID: f1bb9e381f9d
-Revises: 
+Revises: 0a7d3c9e5b21
 Create Date: 2025-01-28 17:50:46.142023
 
 """
@@ -11,7 +11,7 @@ import sqlalchemy as sa
 
 # revision identifiers, used by Alembic.
 revision = 'f1bb9e381f9d'
-down_revision = None
+down_revision = '0a7d3c9e5b21'
 branch_labels = None
 depends_on = None
 
@@ -1,32 +1,35 @@
 # seed.py
+import argparse
+import csv
+import io
+import os
 import random
-import string
+import time
 import bcrypt
-from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
 
 # Adjust these imports based on your actual project layout
-from app.database import SessionLocal, engine
-from app.models import (
-    AdminUser, User, Subject, Teacher,
-    Class, Student, TeacherClass, Score, Schedule
-)
+from app.config import BCRYPT_ROUNDS
+from app.database import sync_engine
+from app.utils.timetable import generate_timetable
 
 # ------------------------------
 # CONFIGURABLES
+# Sizes are for --scale 1; every count except the admins grows with the scale
 # ------------------------------
 NUM_ADMINS = 5
 NUM_CLASSES = 10
 MIN_STUDENTS_PER_CLASS = 18
 MAX_STUDENTS_PER_CLASS = 22
-NUM_SCHEDULES_PER_CLASS = 10
-NUM_SUBJECTS = 10
 SUBJECT_NAMES = [
     "Math", "Physics", "Chemistry", "English", "Literature",
     "Biology", "History", "Geography", "P.E", "Ethics"
 ]
-NUM_TEACHERS = 40  # 4 teachers per subject
+TEACHERS_PER_SUBJECT = 4
 MAX_CLASSES_PER_TEACHER = 3
+LESSONS_PER_SUBJECT = 3  # per class and week; 30 of the 35 weekly slots
+SCHOOL_DAYS = 5
+SLOTS_PER_DAY = 7
 
 # Range for random scores
 SCORE_MIN = 0.0
@@ -35,236 +38,243 @@ SCORE_STEP = 0.25
 
 # A simple password we’ll hash for all seeded users
 DEFAULT_PASSWORD = "password123"
+DEFAULT_ADMIN_EMAIL = "admin@example.com"
 
-# A global set to ensure we never reuse the same email
-USED_EMAILS = set()
+DEFAULT_SEED = 42
+BATCH_SIZE = 10000
 
+FIRST_NAMES = ["John", "Jane", "Alice", "Bob", "Carol", "David", "Eve", "Frank", "Grace", "Heidi"]
+LAST_NAMES = ["Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis"]
 
-def generate_unique_email(base: str) -> str:
-    """
-    Generate a guaranteed-unique email of the form:
-    {base}{suffix}@example.com
-
-    We'll keep trying random 3-digit suffixes until we find one
-    that's not in USED_EMAILS.
-    """
-    while True:
-        suffix = "".join(random.choices(string.digits, k=3))
-        email = f"{base}{suffix}@example.com".lower()
-        if email not in USED_EMAILS:
-            USED_EMAILS.add(email)
-            return email
+TABLES = {
+    "admin_users": ("id", "email", "password", "name"),
+    "subjects": ("id", "name"),
+    "classes": ("id", "name"),
+    "users": ("id", "email", "password", "gender", "date_of_birth", "name"),
+    "teachers": ("id", "user_id", "subject_id"),
+    "teacher_class": ("id", "class_id", "teacher_id"),
+    "students": ("id", "user_id", "class_id"),
+    "schedules": ("id", "date", "class_id", "time_slot", "subject"),
+    "scores": ("id", "student_id", "subject_id", "scores"),
+}
 
 
-def random_date_of_birth():
+def random_date_of_birth(rng: random.Random) -> str:
     """
     Returns a random YYYY-MM-DD string for a plausible date of birth
     (between 1980 and 2012).
     """
     start_date = datetime(1980, 1, 1)
     end_date = datetime(2012, 12, 31)
-    delta = end_date - start_date
-    random_days = random.randrange(delta.days)
-    birth_date = start_date + timedelta(days=random_days)
+    birth_date = start_date + timedelta(days=rng.randrange((end_date - start_date).days))
     return birth_date.strftime("%Y-%m-%d")
 
 
-def random_name():
+def random_name(rng: random.Random) -> str:
     """Generate a random name for demonstration."""
-    first_names = ["John", "Jane", "Alice", "Bob", "Carol", "David", "Eve", "Frank", "Grace", "Heidi"]
-    last_names = ["Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis"]
-    return f"{random.choice(first_names)} {random.choice(last_names)}"
-
-
-def hash_password(plain_text_password: str) -> str:
-    """Hash the password with bcrypt."""
-    return bcrypt.hashpw(plain_text_password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-
-
-def wipe_db(db: Session):
-    """Truncate all relevant tables before seeding."""
-    db.execute("""
-    TRUNCATE TABLE 
-        teacher_class,
-        scores,
-        schedules,
-        teachers,
-        students,
-        subjects,
-        classes,
-        users,
-        admin_users
-    RESTART IDENTITY CASCADE;
-    """)
-    db.commit()
-
-
-def seed_database(db: Session):
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+
+def class_name(index: int) -> str:
+    """Class A, ..., Class Z, Class AA, ... like spreadsheet columns."""
+    name = ""
+    index += 1
+    while index:
+        index, rem = divmod(index - 1, 26)
+        name = chr(ord("A") + rem) + name
+    return f"Class {name}"
+
+
+def password_hash(seed: int = DEFAULT_SEED) -> str:
     """
-    Seed the database with:
-      - 5 Admins
-      - 10 Classes
-      - 10 Subjects
-      - 40 Teachers assigned up to 3 Classes
-      - Students in each Class (18-22)
-      - 10 Schedules per Class
-      - Scores for each Student in each Subject
+    bcrypt hash of DEFAULT_PASSWORD with a salt derived from the seed, so
+    that reseeding stores the very same password column.
     """
+    rng = random.Random(f"password:{seed}")
+    # bcrypt's base64 alphabet; the 22nd character only carries 2 bits
+    alphabet = "./ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789"
+    salt = "".join(rng.choice(alphabet) for _ in range(21)) + rng.choice(".Oeu")
+    return bcrypt.hashpw(DEFAULT_PASSWORD.encode("utf-8"), f"$2b${BCRYPT_ROUNDS:02d}${salt}".encode("ascii")).decode("utf-8")
+
 
-    # 0) WIPE the DB tables
-    print("Wiping database tables...")
-    wipe_db(db)
-
-    # 1) CREATE ADMINS
-    print("Seeding AdminUsers...")
-    for _ in range(NUM_ADMINS):
-        name = random_name()
-        admin = AdminUser(
-            email=generate_unique_email("admin"),
-            password=hash_password(DEFAULT_PASSWORD),
-            name=name
-        )
-        db.add(admin)
-    db.commit()
-
-    # 2) CREATE SUBJECTS
-    print("Seeding Subjects...")
-    subjects = []
-    for name in SUBJECT_NAMES:
-        subj = Subject(name=name)
-        db.add(subj)
-        subjects.append(subj)
-    db.commit()
-
-    # 3) CREATE CLASSES
-    print("Seeding Classes...")
-    classes = []
-    for i in range(NUM_CLASSES):
-        class_name = f"Class {chr(ord('A') + i)}"
-        new_class = Class(name=class_name)
-        db.add(new_class)
-        classes.append(new_class)
-    db.commit()
-
-    # 4) CREATE TEACHERS (40 total => 4 per subject), then assign them to classes
-    print("Seeding Users & Teachers...")
-    teachers = []
-    sub_idx = 0
-    for _ in range(NUM_TEACHERS):
-        # Create a user for the teacher
-        user_name = random_name()
-        user = User(
-            email=generate_unique_email("teacher"),
-            password=hash_password(DEFAULT_PASSWORD),
-            gender=random.choice(["M", "F"]),
-            date_of_birth=random_date_of_birth(),
-            name=user_name
-        )
-        db.add(user)
-        db.flush()  # so user.id is available
-
-        # Assign subject in round-robin style
-        subject = subjects[sub_idx % len(subjects)]
-        sub_idx += 1
-
-        teacher = Teacher(
-            user_id=user.id,
-            subject_id=subject.id
-        )
-        db.add(teacher)
-        teachers.append(teacher)
-    db.commit()
-
-    # TeacherClass assignments (each teacher up to 3 random classes)
-    print("Assigning teachers to classes (up to 3 each)...")
-    for teacher in teachers:
-        num_classes = random.randint(1, MAX_CLASSES_PER_TEACHER)
-        teacher_classes = random.sample(classes, num_classes)
-        for c in teacher_classes:
-            db.execute(
-                """INSERT INTO teacher_class (class_id, teacher_id)
-                   VALUES (:c_id, :t_id)""",
-                {"c_id": c.id, "t_id": teacher.id}
-            )
-    db.commit()
-
-    # 5) CREATE STUDENTS
-    print("Seeding Students in each Class...")
-    all_students = []
-    for c in classes:
-        num_students = random.randint(MIN_STUDENTS_PER_CLASS, MAX_STUDENTS_PER_CLASS)
-        for _ in range(num_students):
-            user_name = random_name()
-            user = User(
-                email=generate_unique_email("student"),
-                password=hash_password(DEFAULT_PASSWORD),
-                gender=random.choice(["M", "F"]),
-                date_of_birth=random_date_of_birth(),
-                name=user_name
-            )
-            db.add(user)
-            db.flush()
-
-            student = Student(
-                user_id=user.id,
-                class_id=c.id
-            )
-            db.add(student)
-            all_students.append(student)
-    db.commit()
-
-    # 6) CREATE SCHEDULES (10 random schedules per class)
-    print("Seeding Schedules...")
-    for c in classes:
-        for _ in range(NUM_SCHEDULES_PER_CLASS):
-            day_num = random.randint(1, 5)  # 1=Mon, 5=Fri
-            slot_num = random.randint(1, 7)
-            chosen_subj = random.choice(subjects)
-            new_sched = Schedule(
-                date=str(day_num),
-                class_id=c.id,
-                time_slot=slot_num,
-                subject=chosen_subj.name
-            )
-            db.add(new_sched)
-    db.commit()
-
-    # 7) CREATE SCORES for each student in each subject
-    print("Seeding Scores for each student in each subject...")
-    possible_scores = []
-    cur = SCORE_MIN
-    while cur <= SCORE_MAX + 0.0001:
-        possible_scores.append(round(cur, 2))
-        cur += SCORE_STEP
-
-    for student in all_students:
-        for subj in subjects:
-            random_score = random.choice(possible_scores)
-            score_entry = Score(
-                student_id=student.id,
-                subject_id=subj.id,
-                scores=str(random_score)  # model is string
-            )
-            db.add(score_entry)
-    db.commit()
-
-    # 8) CREATE A DEFAULT ADMIN USER
-    print("Creating a default AdminUser...")
-    DEFAULT_ADMIN = AdminUser(
-        email="admin@example.com",
-        password=hash_password(DEFAULT_PASSWORD),
-        name="Admin User"
+def generate_dataset(scale: float = 1.0, seed: int = DEFAULT_SEED):
+    """
+    Yield (table, rows) for a complete school, in foreign key order.
+    The same scale and seed always produce the same rows, ids included.
+    Every seeded account shares one bcrypt hash of DEFAULT_PASSWORD, salted
+    from the seed as well.
+    """
+    rng = random.Random(seed)
+    num_classes = max(1, round(NUM_CLASSES * scale))
+    num_teachers = max(len(SUBJECT_NAMES), round(TEACHERS_PER_SUBJECT * len(SUBJECT_NAMES) * scale))
+    password = password_hash(seed)
+
+    # 1) ADMINS, plus the default admin@example.com
+    admins = [(i, f"admin{i}@example.com", password, random_name(rng)) for i in range(1, NUM_ADMINS + 1)]
+    admins.append((NUM_ADMINS + 1, DEFAULT_ADMIN_EMAIL, password, "Admin User"))
+    yield "admin_users", admins
+
+    # 2) SUBJECTS and 3) CLASSES
+    yield "subjects", [(i, name) for i, name in enumerate(SUBJECT_NAMES, start=1)]
+    class_ids = list(range(1, num_classes + 1))
+    yield "classes", [(i, class_name(i - 1)) for i in class_ids]
+
+    # 4) TEACHERS, subjects assigned round-robin, each in up to 3 random classes
+    teacher_users = [
+        (i, f"teacher{i}@example.com", password, rng.choice(["M", "F"]), random_date_of_birth(rng), random_name(rng))
+        for i in range(1, num_teachers + 1)
+    ]
+    yield "users", teacher_users
+    teachers = [(i, i, (i - 1) % len(SUBJECT_NAMES) + 1) for i in range(1, num_teachers + 1)]
+    yield "teachers", teachers
+    assignments = []
+    for teacher_id, _, _ in teachers:
+        k = min(rng.randint(1, MAX_CLASSES_PER_TEACHER), num_classes)
+        assignments.extend((teacher_id, class_id) for class_id in rng.sample(class_ids, k))
+    yield "teacher_class", [(i, class_id, teacher_id) for i, (teacher_id, class_id) in enumerate(assignments, start=1)]
+
+    # 5) STUDENTS in each class; their users come after the teachers'
+    class_sizes = [rng.randint(MIN_STUDENTS_PER_CLASS, MAX_STUDENTS_PER_CLASS) for _ in class_ids]
+    num_students = sum(class_sizes)
+    yield "users", (
+        (num_teachers + i, f"student{i}@example.com", password, rng.choice(["M", "F"]), random_date_of_birth(rng), random_name(rng))
+        for i in range(1, num_students + 1)
+    )
+    student_classes = [class_id for class_id, size in zip(class_ids, class_sizes) for _ in range(size)]
+    yield "students", ((i, num_teachers + i, class_id) for i, class_id in enumerate(student_classes, start=1))
+
+    # 6) SCHEDULES from the clash-free timetable generator
+    placements, _, _ = generate_timetable(
+        class_ids,
+        {teacher_id: subject_id for teacher_id, _, subject_id in teachers},
+        assignments,
+        {subject_id: LESSONS_PER_SUBJECT for subject_id in range(1, len(SUBJECT_NAMES) + 1)},
+        SCHOOL_DAYS,
+        SLOTS_PER_DAY,
+        seed=seed,
+    )
+    yield "schedules", (
+        (i, str(p.day), p.class_id, p.slot, SUBJECT_NAMES[p.subject_id - 1])
+        for i, p in enumerate(placements, start=1)
+    )
+
+    # 7) SCORES for each student in each subject
+    steps = round((SCORE_MAX - SCORE_MIN) / SCORE_STEP)
+    possible_scores = [f"{SCORE_MIN + k * SCORE_STEP:.2f}" for k in range(steps + 1)]
+    yield "scores", (
+        ((student_id - 1) * len(SUBJECT_NAMES) + subject_id, student_id, subject_id, rng.choice(possible_scores))
+        for student_id in range(1, num_students + 1)
+        for subject_id in range(1, len(SUBJECT_NAMES) + 1)
     )
 
-    db.add(DEFAULT_ADMIN)
-    db.commit()
 
+def _batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class CopyWriter:
+    """Load rows into Postgres with COPY, batch_size rows per statement."""
+
+    def __init__(self, connection, batch_size: int = BATCH_SIZE):
+        self.connection = connection
+        self.batch_size = batch_size
+
+    def wipe(self):
+        """Truncate all relevant tables before seeding."""
+        print("Wiping database tables...")
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"TRUNCATE TABLE {', '.join(TABLES)} RESTART IDENTITY CASCADE")
+
+    def write(self, table, rows) -> int:
+        columns = TABLES[table]
+        count = 0
+        with self.connection.cursor() as cursor:
+            for batch in _batches(rows, self.batch_size):
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(batch)
+                buffer.seek(0)
+                cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+                count += len(batch)
+        return count
+
+    def finish(self):
+        # Rows were inserted with explicit ids; move the id sequences past them
+        with self.connection.cursor() as cursor:
+            for table in TABLES:
+                cursor.execute(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), max(id)) FROM {table}"
+                )
+        self.connection.commit()
+
+
+class CsvWriter:
+    """Write one CSV fixture with a header row per table instead of touching the database."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.files = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def wipe(self):
+        pass
+
+    def write(self, table, rows) -> int:
+        if table not in self.files:
+            f = open(os.path.join(self.directory, f"{table}.csv"), "w", newline="")
+            self.files[table] = (f, csv.writer(f))
+            self.files[table][1].writerow(TABLES[table])
+        count = 0
+        for batch in _batches(rows, BATCH_SIZE):
+            self.files[table][1].writerows(batch)
+            count += len(batch)
+        return count
+
+    def finish(self):
+        for f, _ in self.files.values():
+            f.close()
+
+
+def seed(writer, scale: float = 1.0, rng_seed: int = DEFAULT_SEED):
+    """Wipe the target and fill it with the generated dataset."""
+    writer.wipe()
+    for table, rows in generate_dataset(scale, rng_seed):
+        started = time.perf_counter()
+        count = writer.write(table, rows)
+        print(f"Seeded {count} rows into {table} in {time.perf_counter() - started:.2f}s")
+    writer.finish()
     print("Seeding complete!")
 
 
-if __name__ == "__main__":
-    db = SessionLocal()
+def seed_database(scale: float = 1.0, rng_seed: int = DEFAULT_SEED, batch_size: int = BATCH_SIZE):
+    """Seed the database at DATABASE_URL."""
+    connection = sync_engine.raw_connection()
     try:
-        seed_database(db)
+        seed(CopyWriter(connection, batch_size), scale, rng_seed)
     finally:
-        db.close()
+        connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Wipe the database and fill it with a generated school.")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="multiplier for classes, teachers and students (1 = 10 classes, about 200 students)")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help="random seed; the same seed gives the same data")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="rows per COPY statement")
+    parser.add_argument("--csv", metavar="DIR", help="write CSV fixtures to DIR instead of the database")
+    args = parser.parse_args()
+
+    if args.csv:
+        seed(CsvWriter(args.csv), args.scale, args.seed)
+    else:
+        seed_database(args.scale, args.seed, args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import asyncio
+import pytest
+from app import models
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_grade_stats_per_class_subject_and_school(client, add, add_all, admin_headers):
+    subject_id = add(models.Subject, name="Math")
+    class_ids = add_all(models.Class, [{"name": "A"}, {"name": "B"}])
+    user_ids = add_all(models.User, [{"email": f"s{i}@example.com"} for i in range(4)])
+    student_ids = add_all(models.Student, [
+        {"user_id": user_id, "class_id": class_ids[i // 2]} for i, user_id in enumerate(user_ids)
+    ])
+    add_all(models.Score, [
+        {"student_id": student_id, "subject_id": subject_id, "scores": score}
+        for student_id, score in zip(student_ids, (4, 6, 8, 10))
+    ])
+
+    stats = (await client.get("/admin/grade-stats", headers=admin_headers)).json()
+    assert [(c["class_name"], c["count"], c["mean"]) for c in stats["classes"]] == [("A", 2, 5.0), ("B", 2, 9.0)]
+    assert stats["subjects"][0]["median"] == 7.0
+    assert stats["school"]["histogram"] == [0, 0, 0, 0, 1, 0, 1, 0, 1, 1]
+
+    # A score written through the API shows up on the next read
+    teacher_user = add(models.User, email="teacher@example.com")
+    teacher_id = add(models.Teacher, user_id=teacher_user, subject_id=subject_id)
+    response = await client.post(
+        "/teachers/add-score",
+        json={"student_id": student_ids[0], "teacher_id": teacher_id, "score_value": 6},
+        headers=admin_headers,
+    )
+    assert response.status_code == 200
+    stats = (await client.get("/admin/grade-stats", headers=admin_headers)).json()
+    assert stats["classes"][0]["mean"] == 6.0
+    assert stats["school"]["mean"] == 7.5
+
+
+@pytest.mark.parametrize("payload, status", [
+    ({"class_id": 1, "date": "1", "time_slot": 2, "subject": "Math"}, 200),
+    ({"class_id": "1", "date": "1", "time_slot": "2", "subject": "Math"}, 200),
+    ({"class_id": 1, "date": "1", "subject": "Math"}, 400),
+    ({"class_id": 1, "date": "1", "time_slot": "abc", "subject": "Math"}, 400),
+    ({"class_id": 1, "date": "1", "time_slot": 8, "subject": "Math"}, 400),
+    ({"class_id": 1, "date": "1", "time_slot": -1, "subject": "Math"}, 400),
+    ({"class_id": [1], "date": "1", "time_slot": 2, "subject": "Math"}, 400),
+    ({"class_id": 1, "date": 1, "time_slot": 2, "subject": "Math"}, 400),
+    ({"class_id": 2, "date": "1", "time_slot": 2, "subject": "Math"}, 404),
+])
+async def test_create_schedule_validates_input(client, add, admin_headers, payload, status):
+    add(models.Class, name="A")
+
+    response = await client.post("/admin/create-schedule", json=payload, headers=admin_headers)
+    assert response.status_code == status, response.text
+
+
+async def test_create_schedule_rejects_clashes(client, add, admin_headers):
+    class_id = add(models.Class, name="A")
+    payload = {"class_id": class_id, "date": "1", "time_slot": 2, "subject": "Math"}
+
+    assert (await client.post("/admin/create-schedule", json=payload, headers=admin_headers)).status_code == 200
+    response = await client.post("/admin/create-schedule", json={**payload, "subject": "Physics"}, headers=admin_headers)
+    assert response.status_code == 409
+
+
+@pytest.mark.parametrize("payload, status", [
+    ({"teacher_id": 1, "class_id": 1}, 200),
+    ({"teacher_id": "1", "class_id": "1"}, 200),
+    ({"teacher_id": "abc", "class_id": 1}, 400),
+    ({"teacher_id": 1}, 400),
+    ({"teacher_id": 1, "class_id": 2}, 404),
+])
+async def test_assign_teacher_to_class(client, add, admin_headers, payload, status):
+    add(models.Class, name="A")
+    add(models.Teacher, user_id=add(models.User, email="t@example.com"), subject_id=add(models.Subject, name="Math"))
+
+    response = await client.post("/admin/assign-teacher-to-class", json=payload, headers=admin_headers)
+    assert response.status_code == status, response.text
+
+
+async def test_concurrent_schedules_for_one_slot_conflict(client, add, admin_headers):
+    class_id = add(models.Class, name="A")
+    payloads = [{"class_id": class_id, "date": "1", "time_slot": 2, "subject": subject} for subject in ("Math", "Physics")]
+
+    responses = await asyncio.gather(*(
+        client.post("/admin/create-schedule", json=payload, headers=admin_headers) for payload in payloads
+    ))
+    assert sorted(response.status_code for response in responses) == [200, 409]
+
+
+@pytest.mark.parametrize("payload", [
+    {"days": 6},
+    {"slots_per_day": 8},
+    {"days": 0},
+    {"slots_per_day": 10**6},
+    {"weekly_hours": {"1": 36}},
+    {"weekly_hours": {"1": -1}},
+])
+async def test_generate_timetable_bounds_the_week(client, add, admin_headers, payload):
+    add(models.Subject, name="Math")
+
+    response = await client.post("/admin/generate-timetable", json={**payload, "dry_run": True}, headers=admin_headers)
+    assert response.status_code == 400, response.text
@@ -0,0 +1,46 @@
+import asyncio
+import pytest
+from app import models
+from app.database import SessionLocal
+from app.utils.analytics import grade_stats
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def scores(add, add_all):
+    subject_ids = add_all(models.Subject, [{"name": "Math"}, {"name": "Physics"}])
+    class_ids = add_all(models.Class, [{"name": "A"}, {"name": "B"}])
+    user_ids = add_all(models.User, [{"email": f"s{i}@example.com"} for i in range(4)])
+    student_ids = add_all(models.Student, [
+        {"user_id": user_id, "class_id": class_ids[i % 2]} for i, user_id in enumerate(user_ids)
+    ])
+    add_all(models.Score, [
+        {"student_id": student_id, "subject_id": subject_id, "scores": 5}
+        for student_id in student_ids for subject_id in subject_ids
+    ])
+    return class_ids, subject_ids
+
+
+async def get_concurrently(readers: int) -> list:
+    async def get():
+        async with SessionLocal() as db:
+            return await grade_stats.get(db)
+
+    return await asyncio.gather(*(get() for _ in range(readers)))
+
+
+async def test_concurrent_readers_share_one_refresh(client, scores, queries):
+    results = await get_concurrently(5)
+    assert (grade_stats.misses, grade_stats.hits) == (1, 4)
+    assert all(len(result["classes"]) == 4 for result in results)
+
+    class_ids, subject_ids = scores
+    grade_stats.invalidate(class_ids[0], subject_ids[0])
+    grade_stats.invalidate(class_ids[1], subject_ids[1])
+    queries.clear()
+    results = await get_concurrently(5)
+    assert (grade_stats.misses, grade_stats.hits) == (2, 8)
+    assert len(queries) == 3
+    # Readers waiting on the refresh never see the dirty entries missing
+    assert all(len(result["classes"]) == 4 and len(result["subjects"]) == 2 for result in results)
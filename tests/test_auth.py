@@ -0,0 +1,108 @@
+import asyncio
+import math
+import types
+import pytest
+from app.config import AUTH_EMAIL_BURST, AUTH_EMAIL_PER_MINUTE, BCRYPT_MAX_PENDING
+from app.create_admin import create_admin
+from app.utils import auth, rate_limit
+from app.utils.auth import create_access_token
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_bulk_hashing_leaves_slots_for_logins(monkeypatch):
+    running = peak = 0
+
+    async def hash_password(password):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return f"hashed {password}"
+
+    monkeypatch.setattr(auth, "hash_password", hash_password)
+    hashes = await auth.hash_passwords([str(i) for i in range(50)])
+
+    assert hashes == [f"hashed {i}" for i in range(50)]
+    assert peak == auth.BATCH_HASH_LIMIT
+    # Half of the pending slots stay free for logins
+    assert auth.BATCH_HASH_LIMIT <= max(1, BCRYPT_MAX_PENDING // 2)
+
+
+async def test_token_bucket_refills_and_forgets_old_keys(monkeypatch):
+    clock = types.SimpleNamespace(monotonic=lambda: 1000.0)
+    monkeypatch.setattr(rate_limit, "time", clock)
+    backend = rate_limit.MemoryBackend(max_keys=2)
+
+    async def take(key, times=1):
+        return [await backend.take(key, 3, 0.5) for _ in range(times)]
+
+    assert await take("a", 4) == [0, 0, 0, 2.0]
+    clock.monotonic = lambda: 1001.0  # Half a token back
+    assert await take("a") == [1.0]
+    clock.monotonic = lambda: 1011.0  # Refilled, but never beyond the burst
+    assert await take("a", 4) == [0, 0, 0, 2.0]
+
+    await take("b")
+    await take("c")
+    assert list(backend.buckets) == ["b", "c"]
+
+
+async def test_login_attempts_are_limited_per_email(db, client, monkeypatch):
+    monkeypatch.setattr(rate_limit.auth_limiter, "enabled", True)
+    monkeypatch.setattr(rate_limit.auth_limiter, "backend", rate_limit.MemoryBackend())
+
+    async def login(email):
+        return await client.post("/users/login", json={"email": email, "password": "wrong"})
+
+    assert [(await login("a@example.com")).status_code for _ in range(AUTH_EMAIL_BURST)] == [401] * AUTH_EMAIL_BURST
+    response = await login("A@example.com ")
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == str(math.ceil(60 / AUTH_EMAIL_PER_MINUTE))
+    # Other emails from the same client still get through
+    assert (await login("b@example.com")).status_code == 401
+
+
+def bearer(token: str) -> dict:
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.mark.parametrize("method, path", [("get", "/admin/classes"), ("post", "/admin/register")])
+async def test_admin_routes_need_an_admin_token(db, client, method, path):
+    assert (await client.request(method, path)).status_code == 401
+    assert (await client.request(method, path, headers=bearer("not a token"))).status_code == 401
+    user_token = create_access_token({"user_id": 1, "role": "user"})
+    assert (await client.request(method, path, headers=bearer(user_token))).status_code == 403
+
+
+async def test_first_admin_registers_the_next(db, client):
+    create_admin("first@example.com", "secret", "First")
+    with pytest.raises(ValueError):
+        create_admin("first@example.com", "other", "Again")
+
+    login = await client.post("/admin/login", json={"email": "first@example.com", "password": "secret"})
+    assert login.status_code == 200
+    headers = bearer(login.json()["access_token"])
+    response = await client.post(
+        "/admin/register", json={"email": "second@example.com", "password": "secret2", "name": "Second"}, headers=headers
+    )
+    assert response.status_code == 200
+    login = await client.post("/admin/login", json={"email": "second@example.com", "password": "secret2"})
+    assert login.status_code == 200
+
+
+@pytest.mark.parametrize("role, logout, path, status", [
+    ("admin", "/admin/logout", "/admin/classes", 200),
+    # No such student, but the token was accepted
+    ("user", "/users/logout", "/students/scores/1", 404),
+])
+async def test_token_is_refused_after_logout(db, client, role, logout, path, status):
+    headers = bearer(create_access_token({f"{role}_id": 1, "role": role}))
+    assert (await client.get(path, headers=headers)).status_code == status
+    assert (await client.post(logout, headers=headers)).status_code == 200
+
+    for method, url in (("get", path), ("post", logout)):
+        response = await client.request(method, url, headers=headers)
+        assert response.status_code == 401
+        assert response.json()["detail"] == "Token has been revoked"
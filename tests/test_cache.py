@@ -0,0 +1,27 @@
+import pytest
+from app import models
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_reference_data_is_cached_with_etags(client, add, admin_headers, queries):
+    add(models.Class, name="A")
+
+    first = await client.get("/admin/classes", headers=admin_headers)
+    assert first.json() == [{"id": 1, "name": "A"}]
+    etag = first.headers["ETag"]
+
+    queries.clear()
+    again = await client.get("/admin/classes", headers=admin_headers)
+    assert again.json() == first.json() and again.headers["ETag"] == etag
+    assert queries == []
+
+    not_modified = await client.get("/admin/classes", headers={**admin_headers, "If-None-Match": etag})
+    assert not_modified.status_code == 304 and not_modified.content == b""
+
+    # A write drops the cached response; the old ETag no longer matches
+    await client.post("/admin/create-class", params={"name": "B"}, headers=admin_headers)
+    changed = await client.get("/admin/classes", headers={**admin_headers, "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert [c["name"] for c in changed.json()] == ["A", "B"]
+    assert changed.headers["ETag"] != etag
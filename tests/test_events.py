@@ -0,0 +1,76 @@
+import pytest
+from app import models
+from app.utils.events import SCHOOL, broker, stream
+
+pytestmark = pytest.mark.anyio
+
+
+def drain(subscription) -> list:
+    events = []
+    while not subscription.queue.empty():
+        events.append(subscription.queue.get_nowait())
+    return events
+
+
+async def test_score_reaches_only_its_student(client, add, add_all, admin_headers):
+    subject_id = add(models.Subject, name="Math")
+    class_id = add(models.Class, name="A")
+    teacher_id = add(models.Teacher, user_id=add(models.User, email="t@example.com"), subject_id=subject_id)
+    user_ids = add_all(models.User, [{"email": "s1@example.com"}, {"email": "s2@example.com"}])
+    student, classmate = add_all(models.Student, [{"user_id": user_id, "class_id": class_id} for user_id in user_ids])
+    # The topics /events/stream subscribes a student and a teacher to
+    subscriptions = {
+        "student": broker.subscribe([f"student:{student}", f"class:{class_id}"]),
+        "classmate": broker.subscribe([f"student:{classmate}", f"class:{class_id}"]),
+        "teacher": broker.subscribe([f"class:{class_id}"]),
+    }
+    try:
+        response = await client.post(
+            "/teachers/add-score",
+            json={"student_id": student, "teacher_id": teacher_id, "score_value": 8},
+            headers=admin_headers,
+        )
+        assert response.status_code == 200
+        events = {name: drain(subscription) for name, subscription in subscriptions.items()}
+    finally:
+        for subscription in subscriptions.values():
+            broker.unsubscribe(subscription)
+
+    changed = ("scores", f'{{"class_id": {class_id}, "subject_id": {subject_id}}}')
+    assert events["classmate"] == events["teacher"] == [changed]
+    assert [kind for kind, _ in events["student"]] == ["score", "scores"]
+    assert '"score": "8.00"' in events["student"][0][1]
+
+
+async def test_stream_frames_and_ends_on_close(monkeypatch):
+    monkeypatch.setattr("app.utils.events.EVENTS_HEARTBEAT", 0.01)
+    frames = stream(["class:1"])
+    assert await frames.__anext__() == "retry: 3000\n\n"
+    [subscription] = broker.subscriptions["class:1"]
+
+    await broker.publish(["class:2"], "scores", {"class_id": 2})
+    await broker.publish(["class:1"], "scores", {"class_id": 1})
+    await broker.publish([SCHOOL], "timetable", {})
+    assert await frames.__anext__() == 'event: scores\ndata: {"class_id": 1}\n\n'
+    assert await frames.__anext__() == "event: timetable\ndata: {}\n\n"
+    assert await frames.__anext__() == ": keep-alive\n\n"
+
+    subscription.close()
+    assert [frame async for frame in frames] == []
+    assert broker.subscriber_count() == 0
+
+
+async def test_stream_resyncs_after_overflow(monkeypatch):
+    monkeypatch.setattr("app.utils.events.EVENTS_QUEUE_SIZE", 2)
+    frames = stream(["class:1"])
+    await frames.__anext__()
+    [subscription] = broker.subscriptions["class:1"]
+
+    for i in range(3):
+        await broker.publish(["class:1"], "scores", {"n": i})
+    # The queued events are stale once one was lost: the client reloads instead
+    assert await frames.__anext__() == "event: resync\ndata: {}\n\n"
+    await broker.publish(["class:1"], "scores", {"n": 3})
+    assert await frames.__anext__() == 'event: scores\ndata: {"n": 3}\n\n'
+    subscription.close()
+    assert [frame async for frame in frames] == []
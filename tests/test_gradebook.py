@@ -0,0 +1,85 @@
+import csv
+import io
+import re
+import zipfile
+import pytest
+from app import models
+from app.database import SessionLocal, engine
+from app.utils import gradebook
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def school(add, add_all):
+    subject_ids = add_all(models.Subject, [{"name": "Math"}, {"name": "Art & Music"}])
+    class_ids = add_all(models.Class, [{"name": "A"}, {"name": "B"}])
+    user_ids = add_all(models.User, [{"email": f"s{i}@example.com", "name": f"Student {i}"} for i in range(5)])
+    student_ids = add_all(models.Student, [
+        {"user_id": user_id, "class_id": class_ids[i % 2]} for i, user_id in enumerate(user_ids)
+    ])
+    add_all(models.Score, [
+        {"student_id": student_ids[0], "subject_id": subject_ids[0], "scores": 7.5},
+        {"student_id": student_ids[0], "subject_id": subject_ids[1], "scores": 9},
+        {"student_id": student_ids[2], "subject_id": subject_ids[1], "scores": 4.25},
+    ])
+    return {"subject_ids": subject_ids, "class_ids": class_ids, "student_ids": student_ids}
+
+
+async def test_csv_export(school, client, admin_headers):
+    response = await client.get("/admin/export/gradebook", params={"class_id": school["class_ids"][0]}, headers=admin_headers)
+    assert response.headers["content-type"].startswith("text/csv")
+    assert response.headers["content-disposition"] == f'attachment; filename="gradebook-class-{school["class_ids"][0]}.csv"'
+    rows = list(csv.reader(io.StringIO(response.text)))
+    assert rows == [
+        ["student_id", "student_name", "class_id", "class_name", "Math", "Art & Music"],
+        ["1", "Student 0", "1", "A", "7.50", "9.00"],
+        ["3", "Student 2", "1", "A", "", "4.25"],
+        ["5", "Student 4", "1", "A", "", ""],
+    ]
+
+
+async def test_xlsx_export_is_a_readable_workbook(school, client, admin_headers):
+    response = await client.get(
+        "/admin/export/gradebook", params={"format": "xlsx", "subject_id": school["subject_ids"][1]}, headers=admin_headers
+    )
+    archive = zipfile.ZipFile(io.BytesIO(response.content))
+    assert archive.testzip() is None
+    sheet = archive.read("xl/worksheets/sheet1.xml").decode("utf-8")
+    rows = [re.findall(r"<t>(.*?)</t>|<v>(.*?)</v>|<c/>", row) for row in re.findall(r"<row>(.*?)</row>", sheet)]
+    values = [["".join(cell) for cell in row] for row in rows]
+    assert values[0] == ["student_id", "student_name", "class_id", "class_name", "Art &amp; Music"]
+    assert values[1] == ["1", "Student 0", "1", "A", "9.00"]
+    assert values[2] == ["2", "Student 1", "2", "B", ""]
+    assert len(values) == 6
+
+
+@pytest.mark.parametrize("stream", [gradebook.stream_csv, gradebook.stream_xlsx])
+async def test_export_is_sent_batch_by_batch(school, monkeypatch, stream):
+    monkeypatch.setattr(gradebook, "EXPORT_BATCH_SIZE", 2)
+    batch_sizes = []
+
+    async def counted(batches):
+        async for batch in batches:
+            batch_sizes.append(len(batch))
+            yield batch
+
+    chunks = []
+    try:
+        async with SessionLocal() as db:
+            subjects = await gradebook.load_subjects(db)
+            header = gradebook.FIXED_COLUMNS + [name for _, name in subjects]
+            async for chunk in stream(header, counted(gradebook.gradebook_rows(db, subjects))):
+                # Record how many batches had been read when each chunk came out
+                chunks.append((len(batch_sizes), chunk))
+    finally:
+        await engine.dispose()
+
+    assert batch_sizes == [2, 2, 1]
+    # The header goes out before the query is read
+    assert chunks[0][0] == 0
+    if stream is gradebook.stream_csv:
+        assert [(read, chunk.count(b"\n")) for read, chunk in chunks] == [(0, 1), (1, 2), (2, 2), (3, 1)]
+    else:
+        # Deflate holds back output this small until the archive is closed
+        assert zipfile.ZipFile(io.BytesIO(b"".join(chunk for _, chunk in chunks))).testzip() is None
@@ -0,0 +1,71 @@
+import json
+import os
+import subprocess
+import sys
+import pytest
+from prometheus_client.parser import text_string_to_metric_families
+from app.utils import metrics
+from app.utils.rate_limit import auth_limiter
+from app.utils.stats import Histogram
+
+
+def histogram(*values) -> Histogram:
+    h = Histogram()
+    for value in values:
+        h.observe(value)
+    return h
+
+
+def worker_snapshot(pid: int, requests: dict, in_flight: int, rate_limited: int) -> dict:
+    snapshot = metrics.snapshot()
+    snapshot.update(
+        pid=pid,
+        requests=[[*key, h.snapshot()] for key, h in requests.items()],
+        in_flight=in_flight,
+        auth_rate_limited=rate_limited,
+    )
+    return snapshot
+
+
+def samples(text: str) -> dict:
+    return {
+        (sample.name, frozenset(sample.labels.items())): sample.value
+        for family in text_string_to_metric_families(text)
+        for sample in family.samples
+    }
+
+
+@pytest.fixture
+def dead_pid():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def test_snapshots_of_all_workers_are_added_up(tmp_path, monkeypatch, dead_pid):
+    monkeypatch.setattr(metrics, "PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+    monkeypatch.setattr(metrics, "request_seconds", {("GET", "/x", "200"): histogram(0.002)})
+    monkeypatch.setattr(metrics, "in_flight", 1)
+    monkeypatch.setattr(auth_limiter, "rejected", 0)
+
+    workers = [
+        worker_snapshot(os.getppid(), {("GET", "/x", "200"): histogram(0.02, 0.02)}, in_flight=2, rate_limited=3),
+        worker_snapshot(dead_pid, {("GET", "/x", "200"): histogram(1.0), ("POST", "/y", "429"): histogram(0.001)}, in_flight=5, rate_limited=4),
+    ]
+    for snapshot in workers:
+        (tmp_path / f"metrics_{snapshot['pid']}.json").write_text(json.dumps(snapshot))
+    # A truncated snapshot and a temporary file are skipped
+    (tmp_path / "metrics_1.json").write_text('{"pid": ')
+    (tmp_path / f"metrics_{dead_pid}.json.tmp").write_text("{}")
+
+    found = samples(metrics.render().decode("utf-8"))
+    get_x = {("method", "GET"), ("route", "/x"), ("status", "200")}
+    assert found[("http_requests_total", frozenset(get_x))] == 4
+    assert found[("http_requests_total", frozenset({("method", "POST"), ("route", "/y"), ("status", "429")}))] == 1
+    assert found[("http_request_duration_seconds_bucket", frozenset(get_x | {("le", "0.0025")}))] == 1
+    assert found[("http_request_duration_seconds_bucket", frozenset(get_x | {("le", "0.025")}))] == 3
+    assert found[("http_request_duration_seconds_bucket", frozenset(get_x | {("le", "+Inf")}))] == 4
+    assert found[("http_request_duration_seconds_sum", frozenset(get_x))] == pytest.approx(1.042)
+    # Counters of the exited worker are kept, its gauges are not
+    assert found[("auth_rate_limited_total", frozenset())] == 7
+    assert found[("http_requests_in_flight", frozenset())] == 3
@@ -0,0 +1,96 @@
+"""
+Query-plan regression tests: the lookups of the routers must be served by
+indexes, not sequential scans, once the tables hold a realistic amount of
+data. Each endpoint is called against a seeded school, the statements it
+sends are recorded, and every one of them is run again under EXPLAIN.
+"""
+import json
+import pytest
+from sqlalchemy import text
+import seed
+from app.utils import tokens
+from app.utils.cache import response_cache
+from app.utils.rankings import rankings
+
+pytestmark = pytest.mark.anyio
+
+# About 4000 students, 40000 scores and 800 teachers
+SCALE = 20
+
+# Tables whose foreign-key lookups must use an index
+INDEXED_TABLES = {"scores", "students", "teacher_class", "teachers", "schedules"}
+
+
+@pytest.fixture(scope="module")
+def school(database):
+    connection = database.raw_connection()
+    try:
+        seed.seed(seed.CopyWriter(connection), scale=SCALE)
+        connection.commit()
+    finally:
+        connection.close()
+    with database.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("ANALYZE"))
+        # A student, their class and a teacher of that class
+        return conn.execute(text("""
+            SELECT s.id AS student_id, s.user_id, s.class_id, tc.teacher_id, t.subject_id
+            FROM students s
+            JOIN teacher_class tc ON tc.class_id = s.class_id
+            JOIN teachers t ON t.id = tc.teacher_id
+            ORDER BY s.id DESC
+            LIMIT 1
+        """)).one()._asdict()
+
+
+@pytest.fixture
+def clean_caches():
+    for cache in (rankings, response_cache, tokens.token_cache):
+        cache.__init__()
+
+
+def sequential_scans(plan: dict) -> set:
+    """Tables of INDEXED_TABLES that a plan reads with a sequential scan."""
+    found = set()
+    if plan.get("Node Type") == "Seq Scan" and plan.get("Relation Name") in INDEXED_TABLES:
+        found.add(plan["Relation Name"])
+    for child in plan.get("Plans", ()):
+        found |= sequential_scans(child)
+    return found
+
+
+def explain(database, statement: str, parameters) -> dict:
+    # The app's statements use the "format" paramstyle, like psycopg2
+    connection = database.raw_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN (FORMAT JSON) " + statement, parameters)
+            return cursor.fetchone()[0][0]["Plan"]
+    finally:
+        connection.rollback()
+        connection.close()
+
+
+ENDPOINTS = [
+    ("get", "/students/scores/{user_id}", None),
+    ("get", "/students/schedule/{user_id}", None),
+    ("get", "/students/rank/{user_id}", None),
+    ("get", "/teachers/subject/{teacher_id}", None),
+    ("get", "/teachers/classes/{teacher_id}", None),
+    ("get", "/teachers/students/{teacher_id}", None),
+    ("get", "/teachers/dashboard/{teacher_id}", None),
+    ("get", "/teachers/rankings/{class_id}/{subject_id}", None),
+    ("post", "/teachers/add-score", {"student_id": "student_id", "teacher_id": "teacher_id", "score_value": 7}),
+]
+
+
+@pytest.mark.parametrize("method, path, body", ENDPOINTS, ids=[path for _, path, _ in ENDPOINTS])
+async def test_router_queries_use_indexes(school, database, clean_caches, client, admin_headers, queries, method, path, body):
+    json_body = {key: school.get(value, value) for key, value in body.items()} if body else None
+    response = await client.request(method, path.format(**school), json=json_body, headers=admin_headers)
+    assert response.status_code == 200, response.text
+
+    statements = [(s, p) for s, p in queries if s.lstrip().upper().startswith(("SELECT", "WITH"))]
+    assert statements
+    for statement, parameters in statements:
+        plan = explain(database, statement, parameters)
+        assert not sequential_scans(plan), f"{statement}\n{json.dumps(plan, indent=1)}"
@@ -0,0 +1,71 @@
+import random
+from decimal import Decimal
+import pytest
+from app import models
+from app.utils.rankings import ScoreRanking, rankings
+
+pytestmark = pytest.mark.anyio
+
+
+def reference_top(scores: dict) -> list:
+    """(rank, student_id, score) of every student, the way SQL's rank() orders them."""
+    ordered = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+    return [
+        (1 + sum(other > score for other in scores.values()), student_id, score)
+        for student_id, score in ordered
+    ]
+
+
+def check(ranking: ScoreRanking, scores: dict):
+    expected = reference_top(scores)
+    assert len(ranking) == len(scores)
+    assert ranking.top(len(scores) + 1) == expected
+    assert ranking.top(3) == expected[:3]
+    for rank, student_id, _ in expected:
+        assert ranking.rank(student_id) == rank
+
+
+def test_ranking_matches_sorted_reference():
+    generator = random.Random(7)
+    # Few distinct scores, so most students tie with others
+    values = [Decimal(v) for v in ("0", "0.01", "5", "7.25", "7.5", "9.99", "10")]
+    scores = {student_id: generator.choice(values) for student_id in range(1, 41)}
+    ranking = ScoreRanking(scores.items())
+    check(ranking, scores)
+
+    for _ in range(300):
+        student_id = generator.randint(1, 60)
+        if generator.random() < 0.25:
+            ranking.set(student_id, None)
+            scores.pop(student_id, None)
+        else:
+            score = generator.choice(values)
+            ranking.set(student_id, score)
+            scores[student_id] = score
+        check(ranking, scores)
+
+    for student_id in list(scores):
+        ranking.set(student_id, None)
+        del scores[student_id]
+    check(ranking, scores)
+    assert ranking.rank(1) is None
+
+
+def test_out_of_range_scores_rank_at_the_ends():
+    ranking = ScoreRanking([(1, Decimal("12")), (2, Decimal("10")), (3, Decimal("-1")), (4, Decimal("0.5"))])
+    assert ranking.top(4) == [(1, 1, Decimal("12")), (1, 2, Decimal("10")), (3, 4, Decimal("0.5")), (4, 3, Decimal("-1"))]
+    ranking.set(3, Decimal("100"))
+    assert ranking.rank(3) == 1
+
+
+async def test_least_recently_used_groups_are_dropped(client, add, add_all, admin_headers, monkeypatch):
+    subject_id = add(models.Subject, name="Math")
+    class_ids = add_all(models.Class, [{"name": name} for name in "ABC"])
+    monkeypatch.setattr(rankings, "max_groups", 2)
+
+    for class_id in class_ids[:2]:
+        await client.get(f"/teachers/rankings/{class_id}/{subject_id}", headers=admin_headers)
+    # Using A again makes B the least recently used group
+    await client.get(f"/teachers/rankings/{class_ids[0]}/{subject_id}", headers=admin_headers)
+    await client.get(f"/teachers/rankings/{class_ids[2]}/{subject_id}", headers=admin_headers)
+    assert list(rankings.groups) == [(subject_id, class_ids[0]), (subject_id, class_ids[2])]
@@ -0,0 +1,53 @@
+import pytest
+from app import models
+from app.utils.score_import import parse_score_rows
+
+pytestmark = pytest.mark.anyio
+
+
+async def chunks(*parts):
+    for part in parts:
+        yield part
+
+
+async def test_parse_score_rows_reports_bad_lines():
+    errors = []
+    body = b"student_id,score\n1,7.5\n2,abc\n99999999999,5\n0,5\n3\n4,1"
+    rows = [row async for row in parse_score_rows(chunks(body[:20], body[20:]), False, errors)]
+
+    assert rows == [(2, 1, 7.5), (7, 4, 1.0)]
+    assert [error["line"] for error in errors] == [3, 4, 5, 6]
+    assert errors[1]["error"] == "Invalid student_id 99999999999"
+
+
+async def test_import_reports_out_of_range_ids_per_line(client, add, admin_headers):
+    subject_id = add(models.Subject, name="Math")
+    class_id = add(models.Class, name="A")
+    teacher_id = add(models.Teacher, user_id=add(models.User, email="t@example.com"), subject_id=subject_id)
+    add(models.TeacherClass, teacher_id=teacher_id, class_id=class_id)
+    student_id = add(models.Student, user_id=add(models.User, email="s@example.com"), class_id=class_id)
+
+    response = await client.post(
+        f"/teachers/import-scores/{teacher_id}",
+        content=f'{{"student_id": {student_id}, "score": 6}}\n{{"student_id": 99999999999, "score": 5}}\n',
+        headers={**admin_headers, "Content-Type": "application/x-ndjson"},
+    )
+    assert response.status_code == 200
+    assert response.json() == {
+        "imported": 1,
+        "rejected": 1,
+        "errors": [{"line": 2, "error": "Invalid student_id 99999999999"}],
+    }
+
+
+@pytest.mark.parametrize("first_line, rejected", [
+    (b"Student_ID, Score", []),
+    (b"abc,5", [1]),
+    (b"id,score", [1]),
+])
+async def test_only_the_expected_header_is_skipped(first_line, rejected):
+    errors = []
+    rows = [row async for row in parse_score_rows(chunks(first_line + b"\n1,5"), False, errors)]
+
+    assert rows == [(2, 1, 5)]
+    assert [error["line"] for error in errors] == rejected
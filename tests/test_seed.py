@@ -0,0 +1,15 @@
+import bcrypt
+import seed
+
+
+def materialize(scale: float, rng_seed: int) -> list:
+    return [(table, list(rows)) for table, rows in seed.generate_dataset(scale, rng_seed)]
+
+
+def test_same_arguments_give_the_same_rows():
+    first = materialize(0.2, 7)
+    assert first == materialize(0.2, 7)
+    assert first != materialize(0.2, 8)
+
+    users = dict(first)["admin_users"]
+    assert bcrypt.checkpw(seed.DEFAULT_PASSWORD.encode(), users[0][2].encode())
@@ -0,0 +1,116 @@
+import pytest
+from app import models
+
+pytestmark = pytest.mark.anyio
+
+
+def make_teacher(add, add_all, students: int) -> int:
+    """A teacher of one class with the given number of students, half of them scored."""
+    subject_id = add(models.Subject, name="Math")
+    class_id = add(models.Class, name=f"Class of {students}")
+    teacher_user = add(models.User, email=f"teacher{class_id}@example.com", name="Teacher")
+    teacher_id = add(models.Teacher, user_id=teacher_user, subject_id=subject_id)
+    add(models.TeacherClass, teacher_id=teacher_id, class_id=class_id)
+    user_ids = add_all(models.User, [
+        {"email": f"student{class_id}.{i}@example.com", "name": f"Student {i}"} for i in range(students)
+    ])
+    student_ids = add_all(models.Student, [{"user_id": user_id, "class_id": class_id} for user_id in user_ids])
+    add_all(models.Score, [
+        {"student_id": student_id, "subject_id": subject_id, "scores": 7.5} for student_id in student_ids[::2]
+    ])
+    return teacher_id
+
+
+async def test_roster_query_count_does_not_grow_with_roster(client, add, add_all, admin_headers, queries):
+    small = make_teacher(add, add_all, students=1)
+    large = make_teacher(add, add_all, students=40)
+    # The first request of the engine also runs the dialect's setup queries
+    await client.get(f"/teachers/students/{small}", headers=admin_headers)
+
+    counts = {}
+    for teacher_id, size in ((small, 1), (large, 40)):
+        queries.clear()
+        response = await client.get(f"/teachers/students/{teacher_id}", headers=admin_headers)
+        assert response.status_code == 200
+        assert len(response.json()) == size
+        counts[size] = len(queries)
+
+    assert counts[1] == counts[40] == 2
+
+
+async def test_roster_reports_scores_and_missing_teacher(client, add, add_all, admin_headers):
+    teacher_id = make_teacher(add, add_all, students=3)
+
+    roster = (await client.get(f"/teachers/students/{teacher_id}", headers=admin_headers)).json()
+    assert [student["score"] for student in roster] == [7.5, None, 7.5]
+    assert {student["class_name"] for student in roster} == {"Class of 3"}
+
+    response = await client.get(f"/teachers/students/{teacher_id + 1}", headers=admin_headers)
+    assert response.status_code == 404
+
+
+async def test_add_score_inserts_then_updates(client, add, add_all, admin_headers, db):
+    teacher_id = make_teacher(add, add_all, students=2)
+    student_id = 2  # the unscored one
+    payload = {"student_id": student_id, "teacher_id": teacher_id, "score_value": "8.25"}
+
+    response = await client.post("/teachers/add-score", json=payload, headers=admin_headers)
+    assert response.json() == {"message": "Score added successfully"}
+    payload["score_value"] = 9
+    response = await client.post("/teachers/add-score", json=payload, headers=admin_headers)
+    assert response.json() == {"message": "Score updated successfully"}
+
+    with db.connect() as conn:
+        rows = conn.execute(
+            models.Score.__table__.select().where(models.Score.student_id == student_id)
+        ).all()
+    assert [float(row.scores) for row in rows] == [9.0]
+
+
+@pytest.mark.parametrize("payload, status", [
+    ({"student_id": 99, "teacher_id": 1, "score_value": 5}, 404),
+    ({"student_id": 1, "teacher_id": 1, "score_value": 11}, 400),
+    ({"student_id": 99999999999, "teacher_id": 1, "score_value": 5}, 400),
+    ({"student_id": "1", "teacher_id": "1", "score_value": 5}, 200),
+    ({"student_id": "1", "teacher_id": "1", "subject_id": "1", "score_value": 5}, 200),
+    ({"student_id": "abc", "teacher_id": 1, "score_value": 5}, 400),
+    ({"student_id": [1], "teacher_id": 1, "score_value": 5}, 400),
+    ({"teacher_id": 1, "score_value": 5}, 400),
+])
+async def test_add_score_rejects_bad_input(client, add, add_all, admin_headers, payload, status):
+    make_teacher(add, add_all, students=1)
+
+    response = await client.post("/teachers/add-score", json=payload, headers=admin_headers)
+    assert response.status_code == status
+
+
+async def test_out_of_range_path_id_is_a_client_error(client, db, admin_headers):
+    response = await client.get("/teachers/students/99999999999", headers=admin_headers)
+    assert response.status_code == 400
+
+
+async def test_dashboard_in_three_queries_refreshed_by_score_writes(client, add, add_all, admin_headers, queries):
+    teacher_id = make_teacher(add, add_all, students=4)
+    await client.get(f"/teachers/students/{teacher_id}", headers=admin_headers)
+
+    queries.clear()
+    dashboard = (await client.get(f"/teachers/dashboard/{teacher_id}", headers=admin_headers)).json()
+    assert len(queries) == 3
+    assert dashboard["subject"] == {"subject_id": 1, "subject_name": "Math"}
+    [class_data] = dashboard["classes"]
+    assert (class_data["student_count"], class_data["scored_count"], class_data["average_score"]) == (4, 2, 7.5)
+
+    # Served from the cache until a score in one of its classes changes
+    queries.clear()
+    await client.get(f"/teachers/dashboard/{teacher_id}", headers=admin_headers)
+    assert queries == []
+    await client.post(
+        "/teachers/add-score", json={"student_id": 2, "teacher_id": teacher_id, "score_value": 10}, headers=admin_headers
+    )
+    class_data = (await client.get(f"/teachers/dashboard/{teacher_id}", headers=admin_headers)).json()["classes"][0]
+    assert (class_data["scored_count"], class_data["average_score"]) == (3, 8.33)
+
+
+async def test_dashboard_of_missing_teacher(db, client, admin_headers):
+    response = await client.get("/teachers/dashboard/1", headers=admin_headers)
+    assert response.status_code == 404
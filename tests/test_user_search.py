@@ -0,0 +1,112 @@
+import importlib.util
+import pathlib
+import pytest
+from sqlalchemy import text
+from app import models
+
+pytestmark = pytest.mark.anyio
+
+MIGRATION = pathlib.Path(__file__).parents[1] / "migrations" / "versions" / "b5d2e8f41c07_user_search_indexes.py"
+
+
+def load_migration():
+    spec = importlib.util.spec_from_file_location("user_search_indexes", MIGRATION)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def users(add, add_all):
+    user_ids = add_all(models.User, [
+        {"email": "full@example.com", "name": "100% Sure"},
+        {"email": "thousand@example.com", "name": "1000 Sure"},
+        {"email": "a_b@example.com", "name": "Under Score"},
+        {"email": "axb@example.com", "name": "No Underscore"},
+        {"email": "slash@example.com", "name": "Back\\Slash"},
+        {"email": "plain@example.com", "name": "Backxslash"},
+    ])
+    add(models.Student, user_id=user_ids[0])
+    add(models.Teacher, user_id=user_ids[1])
+    return user_ids
+
+
+async def search(client, admin_headers, **params):
+    response = await client.get("/admin/users", params=params, headers=admin_headers)
+    assert response.status_code == 200, response.text
+    return [user["name"] for user in response.json()]
+
+
+@pytest.mark.parametrize("q, names", [
+    ("100%", ["100% Sure"]),
+    ("a_b", ["Under Score"]),
+    ("k\\s", ["Back\\Slash"]),
+    ("SURE", ["100% Sure", "1000 Sure"]),
+    ("score", ["Under Score", "No Underscore"]),
+])
+async def test_search_matches_wildcards_literally(users, client, admin_headers, q, names):
+    assert await search(client, admin_headers, q=q) == names
+
+
+async def test_search_prefix_role_and_pages(users, client, admin_headers):
+    assert await search(client, admin_headers, q="under", match="prefix") == ["Under Score"]
+    assert await search(client, admin_headers, q="sure", match="prefix") == []
+    assert await search(client, admin_headers, q="sure", role="teacher") == ["1000 Sure"]
+
+    response = await client.get("/admin/users", params={"q": "example", "limit": 4}, headers=admin_headers)
+    first = response.json()
+    assert [user["role"] for user in first[:2]] == ["student", "teacher"]
+    rest = await search(client, admin_headers, q="example", after=first[-1]["user_id"])
+    assert [user["name"] for user in first] + rest == [
+        "100% Sure", "1000 Sure", "Under Score", "No Underscore", "Back\\Slash", "Backxslash",
+    ]
+
+
+@pytest.fixture
+def search_indexes(db):
+    migration = load_migration()
+    with db.connect() as conn:
+        has_trgm = conn.execute(text("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")).scalar()
+    indexes = {"prefix": migration.PREFIX_INDEXES}
+    with db.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if has_trgm:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            indexes["substring"] = migration.TRIGRAM_INDEXES
+        for name, expression in migration.PREFIX_INDEXES:
+            conn.execute(text(f"CREATE INDEX {name} ON users ({expression})"))
+        for name, expression in indexes.get("substring", ()):
+            conn.execute(text(f"CREATE INDEX {name} ON users USING gin ({expression})"))
+    yield indexes
+    with db.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for name, _ in migration.PREFIX_INDEXES + indexes.get("substring", []):
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+
+def index_names(plan: dict) -> set:
+    found = {plan["Index Name"]} if "Index Name" in plan else set()
+    for child in plan.get("Plans", ()):
+        found |= index_names(child)
+    return found
+
+
+@pytest.mark.parametrize("match", ["prefix", "substring"])
+async def test_search_uses_pattern_indexes(users, search_indexes, database, client, admin_headers, queries, match):
+    if match not in search_indexes:
+        pytest.skip("pg_trgm is not available on this server")
+    await search(client, admin_headers, q="sure", match=match)
+    [(statement, parameters)] = [(s, p) for s, p in queries if "FROM users" in s]
+
+    # The table is tiny, so rule out the sequential scan and the walk along the
+    # primary key the planner would prefer: only a bitmap scan of an index
+    # that can serve the pattern is left
+    connection = database.raw_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SET enable_seqscan = off")
+            cursor.execute("SET enable_indexscan = off")
+            cursor.execute("EXPLAIN (FORMAT JSON) " + statement, parameters)
+            plan = cursor.fetchone()[0][0]["Plan"]
+    finally:
+        connection.rollback()
+        connection.close()
+    assert {name for name, _ in search_indexes[match]} <= index_names(plan)